@@ -0,0 +1,84 @@
+"""Short-lived cache of authenticated principals.
+
+Every authenticated request would otherwise decode the JWT and look the user
+up in Mongo. Entries are keyed by a hash of the token, so raw tokens are never
+kept in memory. An entry expires at whichever comes first: the cache TTL or
+the token's own `exp`. A hit is safe without re-checking the signature because
+the token was verified when its entry was created.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+
+class _Principal(NamedTuple):
+    user: Any
+    username: str
+    expires_at: float
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Principal]" = OrderedDict()
+        self._by_username: Dict[str, set] = {}
+
+    def get(self, token: str) -> Optional[Any]:
+        key = _token_key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.time():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.user
+
+    def set(self, token: str, user: Any, username: str, token_exp: Optional[float] = None):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        key = _token_key(token)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Principal(user, username, expires_at)
+        self._by_username.setdefault(username, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, username: str):
+        """Drop every cached token of `username`, e.g. after the user changes"""
+        for key in list(self._by_username.get(username, ())):
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_username.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        keys = self._by_username.get(entry.username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_username[entry.username]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
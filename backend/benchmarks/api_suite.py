@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of the main API routes, self-contained.
+
+Runs `server.app` in-process (httpx over ASGI, the default) or under uvicorn
+on a loopback port in a background thread, against a throwaway database on
+a local mongod or against an in-memory stand-in (`--memory`, needs the
+optional mongomock-motor package; it has no $text search and no array
+filters, so `upload` needs a mongod). The database is
+seeded with synthetic vehicles, news and leads, then every workload runs for
+`--duration` seconds with `--concurrency` clients:
+
+    browse   GET /api/vehicles, first page under a few sort orders
+    detail   GET /api/vehicles/{id or slug}
+    filter   GET /api/vehicles with brand / price / fuel filters
+    similar  GET /api/vehicles/{id}/similar
+    login    POST /api/auth/login (bcrypt, BCRYPT_ROUNDS applies)
+    upload   POST /api/vehicles/{id}/images, a distinct 1600x1200 photo each time
+
+For each workload it prints requests per second, p50/p95/p99 latency, the
+share of failed requests and two allocation figures: gen-0 garbage
+collections per 1000 requests (CPython runs one every 700 net container
+allocations, so it follows object churn without slowing the run down) and
+the mean peak of traced memory per request, from a short sequential pass
+under tracemalloc after the timed run. Client and server share the process,
+so both include the client's share.
+
+    python backend/benchmarks/api_suite.py --memory --vehicles 5000 --save-baseline bench.json
+    python backend/benchmarks/api_suite.py --memory --vehicles 5000 --baseline bench.json
+
+With `--baseline`, workloads whose RPS dropped or whose p95 rose by more
+than `--tolerance` are listed and the exit status is 1.
+"""
+
+import argparse
+import asyncio
+import gc
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+BRANDS = ["Seat", "BMW", "Audi", "Kia", "Toyota", "Renault", "Peugeot", "Ford", "Volkswagen", "Mercedes"]
+FUELS = ["Gasolina", "Diésel", "Eléctrico", "Híbrido"]
+TRANSMISSIONS = ["Manual", "Automático"]
+MESSAGE_TYPES = ["contact", "financing", "valuation"]
+ADMIN_PASSWORD = "admin123"  # what /api/init-admin creates
+
+
+class Workload(NamedTuple):
+    name: str
+    send: Callable[["Context", random.Random], Awaitable]
+
+
+class Context(NamedTuple):
+    http: object  # httpx.AsyncClient
+    vehicles: List[dict]
+    token: str
+    photo: bytes
+
+
+def synthetic_vehicles(count: int, rng: random.Random) -> List[dict]:
+    from server import Vehicle, VehicleImage
+
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    vehicles = []
+    for i in range(count):
+        brand = rng.choice(BRANDS)
+        year = rng.randint(2008, 2025)
+        image_id = str(uuid.uuid4())
+        vehicle = Vehicle(
+            brand=brand, model=f"Modelo {i % 40}", year=year,
+            price=round(30000 * 0.9 ** (2025 - year) * rng.uniform(0.7, 1.3)),
+            kilometers=rng.randint(0, 250000), fuel_type=rng.choice(FUELS),
+            transmission=rng.choice(TRANSMISSIONS), color="Blanco", power_hp=rng.randint(70, 350),
+            doors=5, seats=5, trunk_volume=400, vehicle_type=rng.choice(["ocasion", "ocasion", "nuevo", "km0"]),
+            status=rng.choice(["available"] * 8 + ["sold", "hidden"]),
+            description="Vehículo en perfecto estado. " * 10,
+            features=["Navegador", "Climatizador", "Bluetooth"],
+            images=[VehicleImage(id=image_id, filename=f"{image_id}_main.jpg", url=f"/uploads/{image_id}_main.jpg",
+                                 is_primary=True)],
+            slug=f"{year}-{brand.lower()}-modelo-{i}",
+            created_at=base + timedelta(minutes=i), updated_at=base + timedelta(minutes=i),
+        )
+        vehicles.append(vehicle.model_dump())
+    return vehicles
+
+
+async def seed(db, vehicles: List[dict], news: int, leads: int, rng: random.Random):
+    from server import ContactMessage, NewsArticle
+
+    for start in range(0, len(vehicles), 1000):
+        # insert_many adds _id to the dicts; keep the shared list clean
+        await db.vehicles.insert_many([dict(vehicle) for vehicle in vehicles[start:start + 1000]])
+    if news:
+        await db.news.insert_many([
+            NewsArticle(title=f"Noticia {i}", content="Contenido. " * 100, excerpt="Resumen").model_dump()
+            for i in range(news)
+        ])
+    if leads:
+        await db.contact_messages.insert_many([
+            ContactMessage(name=f"Cliente {i}", email=f"cliente{i}@example.com", message="Me interesa",
+                           vehicle_id=rng.choice(vehicles)["id"] if vehicles else None,
+                           message_type=rng.choice(MESSAGE_TYPES)).model_dump()
+            for i in range(leads)
+        ])
+
+
+def make_photo(width: int = 1600, height: int = 1200) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 48).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def unique_photo(photo: bytes) -> bytes:
+    """Same pixels, different bytes: a JPEG comment defeats content-hash deduplication"""
+    comment = uuid.uuid4().hex.encode()
+    return photo[:2] + b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment + photo[2:]
+
+
+def checked(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code}")
+    return response
+
+
+async def browse(ctx: Context, rng: random.Random):
+    sort_by, sort_order = rng.choice([("created_at", "desc"), ("price", "asc"), ("price", "desc"), ("year", "desc")])
+    checked(await ctx.http.get("/api/vehicles", params={"limit": 20, "sort_by": sort_by, "sort_order": sort_order}))
+
+
+async def detail(ctx: Context, rng: random.Random):
+    vehicle = rng.choice(ctx.vehicles)
+    checked(await ctx.http.get(f"/api/vehicles/{vehicle['id'] if rng.random() < 0.5 else vehicle['slug']}"))
+
+
+async def filtered(ctx: Context, rng: random.Random):
+    low = rng.choice([0, 5000, 10000, 20000])
+    checked(await ctx.http.get("/api/vehicles", params={
+        "brand": rng.choice(BRANDS), "fuel_type": rng.choice(FUELS), "min_price": low, "max_price": low + 15000,
+        "status": "available", "limit": 20,
+    }))
+
+
+async def similar(ctx: Context, rng: random.Random):
+    checked(await ctx.http.get(f"/api/vehicles/{rng.choice(ctx.vehicles)['id']}/similar"))
+
+
+async def login(ctx: Context, rng: random.Random):
+    checked(await ctx.http.post("/api/auth/login", json={"username": "admin", "password": ADMIN_PASSWORD}))
+
+
+async def upload(ctx: Context, rng: random.Random):
+    vehicle = rng.choice(ctx.vehicles)
+    checked(await ctx.http.post(
+        f"/api/vehicles/{vehicle['id']}/images",
+        files=[("files", ("photo.jpg", unique_photo(ctx.photo), "image/jpeg"))],
+        headers={"Authorization": f"Bearer {ctx.token}"},
+    ))
+
+
+WORKLOADS = {workload.name: workload for workload in (
+    Workload("browse", browse), Workload("detail", detail), Workload("filter", filtered),
+    Workload("similar", similar), Workload("login", login), Workload("upload", upload),
+)}
+# Image uploads use arrayFilters, which the in-memory stand-in does not implement
+MONGOD_ONLY = {"upload"}
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+async def run_workload(ctx: Context, workload: Workload, concurrency: int, duration: float,
+                       alloc_requests: int, seed_value: int) -> dict:
+    for i in range(min(concurrency, 5)):  # warm caches, pools and lazily built indexes
+        try:
+            await workload.send(ctx, random.Random(seed_value + i))
+        except Exception:
+            pass
+
+    latencies: List[float] = []
+    failures = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(rng: random.Random):
+        nonlocal failures
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await workload.send(ctx, rng)
+            except Exception as e:
+                if not failures:
+                    print(f"{workload.name}: {e!r}", file=sys.stderr)
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    collections = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(random.Random(seed_value * 1000 + i)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    collections = gc.get_stats()[0]["collections"] - collections
+    total = len(latencies) + failures
+
+    peaks = []
+    rng = random.Random(seed_value)
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                await workload.send(ctx, rng)
+            except Exception:
+                continue
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": total,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 2),
+        "errors": round(failures / total, 4) if total else 0.0,
+        "gc0_per_1k": round(collections * 1000 / total, 1) if total else 0.0,
+        "peak_kib": round(statistics.mean(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    print(f"\n{'workload':<9} {'rps':>18} {'p95':>22}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        rps = result["rps"] / before["rps"] - 1 if before["rps"] else 0.0
+        p95 = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        print(f"{name:<9} {before['rps']:>8.1f} -> {result['rps']:>7.1f} {rps:>+6.0%} "
+              f"{before['p95_ms']:>8.2f} -> {result['p95_ms']:>7.2f}ms {p95:>+6.0%}")
+        if rps < -tolerance or p95 > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results: Dict[str, dict]):
+    print(f"{'workload':<9} {'requests':>9} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} "
+          f"{'gc0/1k':>7} {'KiB/req':>8}")
+    for name, result in results.items():
+        peak = f"{result['peak_kib']:>8.1f}" if result["peak_kib"] is not None else f"{'-':>8}"
+        print(f"{name:<9} {result['requests']:>9} {result['rps']:>9.1f} {result['p50_ms']:>7.2f}ms "
+              f"{result['p95_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms {result['errors']:>7.1%} "
+              f"{result['gc0_per_1k']:>7.1f} {peak}")
+
+
+class UvicornThread:
+    """`server.app` under uvicorn on a loopback port, lifespan included"""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def benchmark(args) -> Dict[str, dict]:
+    import httpx
+
+    import server
+    from image_store import ImageStore
+    from storage import LocalShardedStorage
+    from upload_serving import UploadServer
+
+    if args.memory:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    upload_dir = tempfile.TemporaryDirectory(prefix="benchmark-uploads-")
+    server.storage = LocalShardedStorage(upload_dir.name)
+    server.image_store = ImageStore(server.db.image_blobs, server.storage)
+    server.upload_server = UploadServer(server.storage)
+
+    rng = random.Random(args.seed)
+    vehicles = synthetic_vehicles(args.vehicles, rng)
+    started = time.perf_counter()
+
+    async def seed_database():
+        await seed(server.db, vehicles, args.news, args.leads, rng)
+
+    async def drop_database():
+        if not args.keep_data and not args.memory:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+    # Seed before the app's own startup so counters and indexes see the data
+    server.app.router.on_startup.insert(0, seed_database)
+    server.app.router.on_shutdown.insert(0, drop_database)
+
+    ctx_args = {"vehicles": vehicles, "photo": make_photo()}
+    results = {}
+
+    async def drive(http):
+        print(f"seeded {len(vehicles)} vehicles, {args.news} news, {args.leads} leads "
+              f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        checked(await http.post("/api/init-admin"))
+        token = checked(await http.post(
+            "/api/auth/login", json={"username": "admin", "password": ADMIN_PASSWORD}
+        )).json()["access_token"]
+        ctx = Context(http=http, token=token, **ctx_args)
+        for index, name in enumerate(args.workloads):
+            print(f"running {name}...", file=sys.stderr)
+            results[name] = await run_workload(
+                ctx, WORKLOADS[name], args.concurrency, args.duration, args.alloc_requests, args.seed + index
+            )
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        if args.target == "uvicorn":
+            with UvicornThread(server.app, args.port):
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                             timeout=60) as http:
+                    await drive(http)
+        else:
+            for handler in server.app.router.on_startup:
+                await handler()
+            try:
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as http:
+                    await drive(http)
+            finally:
+                for handler in server.app.router.on_shutdown:
+                    await handler()
+    finally:
+        upload_dir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--port", type=int, default=8765, help="uvicorn target port")
+    parser.add_argument("--memory", action="store_true", help="in-memory database instead of MONGO_URL")
+    parser.add_argument("--keep-data", action="store_true", help="do not drop the seeded database")
+    parser.add_argument("--vehicles", type=int, default=2000)
+    parser.add_argument("--news", type=int, default=50)
+    parser.add_argument("--leads", type=int, default=500)
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), help="default: all that the database supports")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per workload")
+    parser.add_argument("--alloc-requests", type=int, default=20, help="requests in the tracemalloc pass")
+    parser.add_argument("--no-response-cache", action="store_true", help="measure every GET against the database")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", type=Path, help="write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="compare against results saved with --save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed RPS drop / p95 rise, as a fraction")
+    args = parser.parse_args()
+    if args.workloads is None:
+        args.workloads = [name for name in WORKLOADS if not (args.memory and name in MONGOD_ONLY)]
+    elif args.memory and MONGOD_ONLY.intersection(args.workloads):
+        parser.error(f"--memory cannot run: {', '.join(sorted(MONGOD_ONLY.intersection(args.workloads)))}")
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = f"benchmark_{uuid.uuid4().hex[:8]}"
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+    results = asyncio.run(benchmark(args))
+    print_results(results)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "options": {name: getattr(args, name) for name in (
+                "target", "memory", "vehicles", "news", "leads", "concurrency", "duration", "no_response_cache"
+            )},
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"\nsaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        saved = json.loads(args.baseline.read_text())
+        regressions = compare(results, saved["results"], args.tolerance)
+        if regressions:
+            print(f"\nregressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Peak memory of processing one large JPEG upload, per ingestion path.
+
+    legacy    whole file read into bytes, decoded at full resolution
+    streamed  spooled file opened by path, JPEG draft decoding to the
+              largest output width
+
+Each measurement runs in a fresh interpreter and reports its peak RSS
+(VmHWM, or ru_maxrss off Linux), with an idle interpreter that only imported
+the pipeline as the baseline. Generates the test photo itself:
+
+    python backend/benchmarks/image_memory.py --megapixels 12 24 50
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+WORKER = """
+import json, resource, sys
+sys.path.insert(0, {backend!r})
+from image_pipeline import DEFAULT_FORMATS, DEFAULT_WIDTHS, process_image
+mode, path = sys.argv[1], sys.argv[2]
+if mode == "legacy":
+    with open(path, "rb") as f:
+        process_image(f.read(), "photo.jpg", DEFAULT_WIDTHS, DEFAULT_FORMATS, draft=False)
+elif mode == "streamed":
+    process_image(path, "photo.jpg", DEFAULT_WIDTHS, DEFAULT_FORMATS)
+try:
+    # VmHWM resets on exec; ru_maxrss can carry the parent's peak over on Linux
+    with open("/proc/self/status") as status:
+        peak = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"maxrss_kb": peak}}))
+"""
+
+
+def make_photo(path: Path, megapixels: float):
+    from PIL import Image
+
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    # Noise compresses like a real photo; a gradient would be unrealistically small
+    Image.effect_noise((width // 4, height // 4), 40).resize((width, height)).convert("RGB").save(
+        path, "JPEG", quality=90
+    )
+    return width, height
+
+
+def peak_rss_mb(mode: str, path: Path) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER.format(backend=str(BACKEND_DIR)), mode, str(path)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["maxrss_kb"] / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[12, 24, 50])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'MP':>5} {'size':>11} {'file':>8} {'idle':>8} {'legacy':>8} {'streamed':>9}")
+        for megapixels in args.megapixels:
+            path = Path(directory) / f"photo-{megapixels:g}mp.jpg"
+            width, height = make_photo(path, megapixels)
+            idle = peak_rss_mb("idle", path)
+            legacy = peak_rss_mb("legacy", path)
+            streamed = peak_rss_mb("streamed", path)
+            print(f"{megapixels:>5g} {width:>5}x{height:<5} {path.stat().st_size / 2**20:>6.1f}MB "
+                  f"{idle:>6.0f}MB {legacy:>6.0f}MB {streamed:>7.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of a vehicle list page, per path, at several page sizes.
+
+    legacy     Vehicle(**doc) per item, then what FastAPI does for
+               response_model: dump, re-validate, jsonable, json.dumps
+    validated  Vehicle(**doc) per item, then one TypeAdapter.dump_json
+    trusted    serialization.dump_documents straight from the documents
+
+Runs fully in-process, no database needed:
+
+    python backend/benchmarks/serialization.py --sizes 20 100 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from serialization import dump_documents  # noqa: E402
+from server import Vehicle  # noqa: E402
+
+
+def synthetic_documents(count: int) -> list:
+    base = datetime(2025, 1, 1)
+    documents = []
+    for i in range(count):
+        image_id = str(uuid.uuid4())
+        documents.append({
+            "id": str(uuid.uuid4()),
+            "brand": ["Seat", "BMW", "Audi", "Kia"][i % 4],
+            "model": f"Modelo {i}",
+            "year": 2010 + i % 15,
+            "price": 9000.0 + i * 37,
+            "kilometers": 1000 * (i % 200),
+            "fuel_type": ["Gasolina", "Diésel", "Eléctrico", "Híbrido"][i % 4],
+            "transmission": ["Manual", "Automático"][i % 2],
+            "color": "Blanco",
+            "power_hp": 90 + i % 200,
+            "doors": 5,
+            "seats": 5,
+            "trunk_volume": 400,
+            "warranty_months": 12,
+            "vehicle_type": "ocasion",
+            "status": "available",
+            "description": "Vehículo en perfecto estado. " * 20,
+            "features": ["Navegador", "Climatizador", "Sensores de aparcamiento", "Bluetooth"],
+            "images": [{
+                "id": image_id,
+                "filename": f"{image_id}_main.jpg",
+                "url": f"/uploads/{image_id}_main.jpg",
+                "is_primary": True,
+                "variants": [
+                    {"url": f"/uploads/{image_id}_{w}w.{ext}", "width": w, "height": w * 3 // 4,
+                     "format": fmt, "bytes": w * 40}
+                    for w in (320, 640, 960, 1200, 1920) for fmt, ext in (("jpeg", "jpg"), ("webp", "webp"))
+                ],
+            }],
+            "slug": f"2020-seat-modelo-{i}",
+            "created_at": base + timedelta(minutes=i),
+            "updated_at": base + timedelta(minutes=i, seconds=30),
+        })
+    return documents
+
+
+ADAPTER = TypeAdapter(List[Vehicle])
+
+
+def legacy(documents):
+    models = [Vehicle(**document) for document in documents]
+    content = [model.model_dump() for model in models]
+    revalidated = ADAPTER.validate_python(content)
+    return json.dumps(jsonable_encoder(revalidated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def validated(documents):
+    return ADAPTER.dump_json([Vehicle(**document) for document in documents])
+
+
+def trusted(documents):
+    return dump_documents(Vehicle, documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per measurement")
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'path':<10} {'per call':>12} {'per item':>10} {'speedup':>8}")
+    for size in args.sizes:
+        documents = synthetic_documents(size)
+        assert trusted(documents) == validated(documents)
+        results = {}
+        for name, func in (("legacy", legacy), ("validated", validated), ("trusted", trusted)):
+            timer = timeit.Timer(lambda: func(documents))
+            loops, _ = timer.autorange()
+            loops = max(loops, int(loops * args.min_time / 0.2))
+            best = min(timer.repeat(repeat=5, number=loops)) / loops
+            results[name] = best
+        for name, seconds in results.items():
+            print(f"{size:>6} {name:<10} {seconds * 1e3:>10.3f}ms {seconds / size * 1e6:>8.1f}us "
+                  f"{results['legacy'] / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Latency of `SimilarityIndex.nearest` (GET /api/vehicles/{id}/similar) on a
+synthetic inventory, plus the cost of a full build and of incremental writes.
+
+Results are checked against a brute-force ranking over explicit one-hot
+vectors, so the fast path is known to return the same vehicles.
+
+Runs fully in-process, no database needed:
+
+    python backend/benchmarks/similarity.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from similarity import (  # noqa: E402
+    CATEGORICAL_FEATURES, CATEGORICAL_WEIGHTS, SimilarityIndex, _numeric
+)
+
+BRANDS = ["Seat", "BMW", "Audi", "Kia", "Toyota", "Renault", "Peugeot", "Ford", "Volkswagen", "Mercedes",
+          "Hyundai", "Skoda", "Opel", "Citroën", "Fiat", "Mazda", "Nissan", "Volvo", "Dacia", "Tesla"]
+FUELS = ["Gasolina", "Diésel", "Eléctrico", "Híbrido"]
+TRANSMISSIONS = ["Manual", "Automático"]
+
+
+def synthetic_documents(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [{
+        "id": f"v{i}",
+        "brand": rng.choice(BRANDS),
+        "fuel_type": rng.choice(FUELS),
+        "transmission": rng.choice(TRANSMISSIONS),
+        "price": rng.randint(3000, 90000),
+        "year": rng.randint(2005, 2025),
+        "kilometers": rng.randint(0, 300000),
+        "power_hp": rng.randint(70, 400),
+        "status": "available" if rng.random() < 0.85 else rng.choice(["sold", "reserved", "hidden"]),
+    } for i in range(count)]
+
+
+def brute_force(documents: list, index: SimilarityIndex, vehicle_id: str, k: int) -> list:
+    """Reference ranking: explicit one-hot vectors and a full sort"""
+    numeric = np.array([_numeric(document) for document in documents], dtype=np.float64)
+    numeric *= index._scale.astype(np.float64)
+    columns = [numeric]
+    for weight, name in zip(CATEGORICAL_WEIGHTS, CATEGORICAL_FEATURES):
+        values = sorted({str(document.get(name) or "").strip().lower() for document in documents})
+        position = {value: i for i, value in enumerate(values)}
+        one_hot = np.zeros((len(documents), len(values)))
+        for row, document in enumerate(documents):
+            one_hot[row, position[str(document.get(name) or "").strip().lower()]] = np.sqrt(weight)
+        columns.append(one_hot)
+    vectors = np.hstack(columns)
+    query = next(i for i, document in enumerate(documents) if document["id"] == vehicle_id)
+    distances = ((vectors - vectors[query]) ** 2).sum(axis=1)
+    ranked = [i for i in np.argsort(distances, kind="stable")
+              if i != query and documents[i]["status"] == "available"]
+    return [(documents[i]["id"], distances[i]) for i in ranked[:k]]
+
+
+def percentile(samples: list, fraction: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=6, help="neighbours per lookup")
+    args = parser.parse_args()
+
+    print(f"{'vehicles':>9} {'build':>9} {'upsert':>9} {'remove':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for size in args.sizes:
+        documents = synthetic_documents(size)
+        index = SimilarityIndex()
+        started = time.perf_counter()
+        index.build(documents)
+        build = time.perf_counter() - started
+
+        rng = random.Random(2)
+        for vehicle_id in (documents[rng.randrange(size)]["id"] for _ in range(3)):
+            found = index.nearest(vehicle_id, args.limit)
+            expected = brute_force(documents, index, vehicle_id, args.limit)
+            # Equal distances may be ordered differently; compare the distances
+            assert len(found) == len(expected)
+            distances = dict((document_id, distance) for document_id, distance in
+                             brute_force(documents, index, vehicle_id, size))
+            assert np.allclose([distances[i] for i in found], [d for _, d in expected], rtol=1e-4, atol=1e-4)
+
+        samples = []
+        for _ in range(args.queries):
+            vehicle_id = documents[rng.randrange(size)]["id"]
+            started = time.perf_counter()
+            index.nearest(vehicle_id, args.limit)
+            samples.append(time.perf_counter() - started)
+
+        writes = synthetic_documents(1000, seed=3)
+        started = time.perf_counter()
+        for document in writes:
+            index.upsert({**document, "id": f"new-{document['id']}"})
+        upsert = (time.perf_counter() - started) / len(writes)
+        started = time.perf_counter()
+        for document in writes:
+            index.remove(f"new-{document['id']}")
+        remove = (time.perf_counter() - started) / len(writes)
+
+        print(f"{size:>9} {build * 1e3:>7.1f}ms {upsert * 1e6:>7.1f}us {remove * 1e6:>7.1f}us "
+              f"{statistics.median(samples) * 1e3:>7.3f}ms {percentile(samples, 0.95) * 1e3:>7.3f}ms "
+              f"{percentile(samples, 0.99) * 1e3:>7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Public GET latency while a large image upload is running.
+
+Polls GET /api/vehicles from several threads, first on an idle server and then
+while an admin uploads a batch of large photos, and prints p50/p95/p99 for both
+phases. Run it against a local server, once with IMAGE_WORKERS=0 (thread pool)
+and once with the default process pool, to compare.
+
+The whole batch goes in one request, so it must fit the server's
+UPLOAD_MAX_REQUEST_BYTES (100 MB by default); a larger batch is refused here
+before any request is sent, with the override the server needs.
+
+    python backend/benchmarks/upload_latency.py --base-url http://localhost:8001/api --files 6
+"""
+
+import argparse
+import io
+import os
+import statistics
+import threading
+import time
+
+import requests
+from PIL import Image
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_photo(width: int, height: int, seed: int) -> bytes:
+    """Build a noisy JPEG so the encoder cannot take shortcuts"""
+    noise = Image.effect_noise((width, height), 64 + seed % 32).convert("RGB")
+    buffer = io.BytesIO()
+    noise.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def admin_token(base_url: str, username: str, password: str) -> str:
+    requests.post(f"{base_url}/init-admin")
+    response = requests.post(f"{base_url}/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def create_vehicle(base_url: str, headers: dict) -> str:
+    response = requests.post(f"{base_url}/vehicles", headers=headers, json={
+        "brand": "Benchmark", "model": "Upload", "year": 2024, "price": 10000,
+        "kilometers": 0, "fuel_type": "Gasolina", "transmission": "Manual",
+        "color": "Blanco", "power_hp": 100, "doors": 5, "seats": 5,
+        "vehicle_type": "nuevo", "status": "hidden", "description": "Benchmark vehicle",
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def poll(base_url: str, stop: threading.Event, samples: list):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{base_url}/vehicles", params={"limit": 20})
+        samples.append((time.perf_counter() - started) * 1000)
+
+
+def measure(base_url: str, pollers: int, action) -> list:
+    stop = threading.Event()
+    samples = []
+    threads = [threading.Thread(target=poll, args=(base_url, stop, samples)) for _ in range(pollers)]
+    for thread in threads:
+        thread.start()
+    try:
+        action()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return samples
+
+
+def report(label: str, samples: list):
+    print(f"{label:<16} n={len(samples):<6} "
+          f"p50={percentile(samples, 50):8.1f}ms "
+          f"p95={percentile(samples, 95):8.1f}ms "
+          f"p99={percentile(samples, 99):8.1f}ms "
+          f"max={max(samples, default=0):8.1f}ms "
+          f"mean={statistics.fmean(samples) if samples else 0:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--files", type=int, default=6, help="photos per upload (about 12 MB each at 4000x3000)")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--pollers", type=int, default=4, help="concurrent GET threads")
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    parser.add_argument("--max-request-bytes", type=int,
+                        default=int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", str(100 * 1024 * 1024))),
+                        help="the server's UPLOAD_MAX_REQUEST_BYTES")
+    args = parser.parse_args()
+
+    photos = [make_photo(args.width, args.height, seed) for seed in range(args.files)]
+    total_bytes = sum(map(len, photos))
+    print(f"Generated {len(photos)} photos, {total_bytes / 1e6:.1f} MB total")
+    # Multipart headers add a little per file; leave room so the server does not answer 413
+    needed = total_bytes + 64 * 1024 * len(photos)
+    if needed > args.max_request_bytes:
+        raise SystemExit(
+            f"{total_bytes / 1e6:.1f} MB of photos will not fit one upload of at most "
+            f"{args.max_request_bytes / 1e6:.1f} MB. Use fewer or smaller photos, or start the server with "
+            f"UPLOAD_MAX_REQUEST_BYTES={needed} and pass --max-request-bytes {needed}."
+        )
+
+    headers = {"Authorization": f"Bearer {admin_token(args.base_url, args.username, args.password)}"}
+    vehicle_id = create_vehicle(args.base_url, headers)
+
+    try:
+        idle = measure(args.base_url, args.pollers, lambda: time.sleep(args.idle_seconds))
+
+        upload_time = {}
+
+        def upload():
+            files = [("files", (f"photo{i}.jpg", photo, "image/jpeg")) for i, photo in enumerate(photos)]
+            started = time.perf_counter()
+            response = requests.post(f"{args.base_url}/vehicles/{vehicle_id}/images", headers=headers, files=files)
+            response.raise_for_status()
+            upload_time["seconds"] = time.perf_counter() - started
+
+        during = measure(args.base_url, args.pollers, upload)
+    finally:
+        requests.delete(f"{args.base_url}/vehicles/{vehicle_id}", headers=headers)
+
+    print(f"Upload of {args.files} photos took {upload_time.get('seconds', 0):.2f}s")
+    report("idle", idle)
+    report("during upload", during)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Streaming exports of a Mongo cursor as NDJSON or CSV.
+
+Documents are shaped with the same trusted-read shapers as the JSON routes and
+written to the response as the cursor yields them, in chunks of roughly
+`CHUNK_BYTES`, so memory stays flat however many rows are exported.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Type
+
+from pydantic import BaseModel
+
+from inventory_import import LIST_SEPARATOR
+from serialization import compile_shaper, dump_document
+
+CHUNK_BYTES = 64 * 1024
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+CURSOR_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+async def ndjson_chunks(cursor, model: Type[BaseModel]) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for document in cursor.batch_size(CURSOR_BATCH_SIZE):
+        buffer += dump_document(model, document)
+        buffer += b"\n"
+        if len(buffer) >= CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _csv_cell(value):
+    """Flatten a value into one CSV cell; lists use the import's separator so
+    an exported file can be imported again.
+
+    Leads come from the public contact form, so text that a spreadsheet
+    would evaluate (`=HYPERLINK(...)`) is prefixed with `'` to keep it text.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, list):
+        value = LIST_SEPARATOR.join(
+            str(item.get("url", "")) if isinstance(item, dict) else str(item) for item in value
+        )
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def csv_chunks(cursor, model: Type[BaseModel]) -> AsyncIterator[bytes]:
+    shape = compile_shaper(model)
+    columns = list(model.model_fields)
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    async for document in cursor.batch_size(CURSOR_BATCH_SIZE):
+        shaped = shape(document)
+        writer.writerow([_csv_cell(shaped[name]) for name in columns])
+        if text.tell() >= CHUNK_BYTES:
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode()
+
+
+def export_chunks(cursor, model: Type[BaseModel], format: str) -> AsyncIterator[bytes]:
+    return csv_chunks(cursor, model) if format == "csv" else ndjson_chunks(cursor, model)
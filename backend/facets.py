@@ -0,0 +1,126 @@
+"""Facet counts for the vehicle catalog filters.
+
+All facets are computed in a single `$facet` aggregation. Facets are
+disjunctive: the counts for a field ignore the filter on that same field, so
+the brand list still shows every brand available under the other filters
+instead of collapsing to the selected one.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+TERM_FACETS = ("brand", "fuel_type", "transmission", "vehicle_type", "year")
+
+# Upper bound of the last bucket is exclusive, so it must exceed any real price
+PRICE_BUCKETS = [0, 5000, 10000, 15000, 20000, 30000, 50000, 10_000_000]
+
+
+def facet_pipeline(conditions: Dict[str, dict]) -> List[dict]:
+    """Build the aggregation for a filter given as `{field: condition}`"""
+    faceted = set(TERM_FACETS) | {"price"}
+    # Conditions on non-facet fields (status) apply to every facet, so they
+    # run once before $facet where they can use an index
+    shared = {k: v for k, v in conditions.items() if k not in faceted}
+    own = {k: v for k, v in conditions.items() if k in faceted}
+
+    def match_without(field: str) -> dict:
+        return {"$match": {k: v for k, v in own.items() if k != field}}
+
+    facets = {
+        field: [
+            match_without(field),
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+        for field in TERM_FACETS
+    }
+    facets["price"] = [
+        match_without("price"),
+        {"$bucket": {
+            "groupBy": "$price",
+            "boundaries": PRICE_BUCKETS,
+            "default": "other",
+            "output": {"count": {"$sum": 1}},
+        }},
+    ]
+    facets["total"] = [{"$match": own}, {"$count": "count"}]
+    return [{"$match": shared}, {"$facet": facets}]
+
+
+def shape_facets(result: dict) -> dict:
+    """Turn the raw `$facet` output into the response document"""
+    shaped = {
+        field: [{"value": row["_id"], "count": row["count"]} for row in result.get(field, []) if row["_id"] is not None]
+        for field in TERM_FACETS
+    }
+    bounds = dict(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]))
+    shaped["price"] = [
+        {"min": row["_id"], "max": bounds[row["_id"]], "count": row["count"]}
+        for row in result.get("price", []) if row["_id"] in bounds
+    ]
+    total = result.get("total", [])
+    shaped["total"] = total[0]["count"] if total else 0
+    return shaped
+
+
+def facet_cache_key(conditions: Dict[str, dict]) -> str:
+    return json.dumps(conditions, sort_keys=True, default=str)
+
+
+class TTLCache:
+    """TTL + LRU of results derived from the vehicles, cleared on every vehicle write.
+
+    Used for facet counts and pricing analytics. `generation` is bumped by
+    each invalidation; a result computed from a read that started before a
+    write is dropped instead of cached. The invalidation only reaches this
+    process, so `ttl` bounds how long other workers keep serving results
+    from before a write.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, generation: int):
+        if self.ttl <= 0 or generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,42 @@
+"""Sparse fieldsets (`fields=`) for read routes.
+
+A fieldset becomes both a Mongo projection, so unrequested fields are never
+read from the database, and a generated Pydantic model restricted to those
+fields, so the response keeps the types and serialization of the full model.
+"""
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+ALWAYS_INCLUDED = ("id",)
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated `fields` parameter against `model`"""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(model.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    ordered = [name for name in model.model_fields if name in set(requested) | set(ALWAYS_INCLUDED)]
+    return tuple(ordered)
+
+
+def projection_for(fields: Tuple[str, ...], *extra: str) -> Dict[str, int]:
+    """Mongo projection for `fields` plus fields the query itself needs (sort keys)"""
+    projection = {name: 1 for name in (*fields, *extra)}
+    projection["_id"] = 0
+    return projection
+
+
+@lru_cache(maxsize=128)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A copy of `model` with only `fields`, keeping their types and defaults"""
+    definitions = {
+        name: (model.model_fields[name].annotation, model.model_fields[name])
+        for name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
@@ -0,0 +1,97 @@
+"""HTTP validators and Cache-Control policies for public GET routes.
+
+Strong ETags are a hash of the exact response bytes, computed once when a
+response is rendered and stored alongside it in the response cache. Requests
+carrying a matching `If-None-Match` (or, without one, an `If-Modified-Since`
+not older than `Last-Modified`) get an empty 304.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Route -> Cache-Control. Override with HTTP_CACHE_POLICY_<ROUTE>, e.g.
+# HTTP_CACHE_POLICY_VEHICLES="public, max-age=30, stale-while-revalidate=120"
+DEFAULT_POLICIES = {
+    "vehicles": "public, max-age=0, s-maxage=30, stale-while-revalidate=120",
+    "vehicle": "public, max-age=0, s-maxage=60, stale-while-revalidate=300",
+    "news": "public, max-age=60, stale-while-revalidate=600",
+    "news_article": "public, max-age=300, stale-while-revalidate=3600",
+    "testimonials": "public, max-age=300, stale-while-revalidate=3600",
+    # Upload names never get new content, so browsers and CDNs may keep them for a year
+    "uploads": "public, max-age=31536000, immutable",
+}
+
+# Headers a 304 must repeat from the full response
+VALIDATOR_HEADERS = ("ETag", "Last-Modified", "Cache-Control", "Vary")
+
+
+def cache_policy(route: str) -> Optional[str]:
+    return os.environ.get(f"HTTP_CACHE_POLICY_{route.upper()}", DEFAULT_POLICIES.get(route))
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def latest_timestamp(items: Iterable) -> Optional[datetime]:
+    """Newest `updated_at` (or `created_at`) among models or raw documents"""
+    latest = None
+    for item in items:
+        fields = item if isinstance(item, dict) else vars(item)
+        stamp = fields.get("updated_at") or fields.get("created_at")
+        if stamp is None:
+            continue
+        if stamp.tzinfo is None:
+            # Mongo returns naive datetimes that are UTC
+            stamp = stamp.replace(tzinfo=timezone.utc)
+        if latest is None or stamp > latest:
+            latest = stamp
+    return latest
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def validator_headers(route: str, body: bytes, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {"ETag": strong_etag(body)}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    policy = cache_policy(route)
+    if policy:
+        headers["Cache-Control"] = policy
+    return headers
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    etag = headers.get("ETag")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers={k: headers[k] for k in VALIDATOR_HEADERS if k in headers})
@@ -0,0 +1,234 @@
+"""Image processing pipeline.
+
+PIL decoding, resizing and encoding is CPU bound, so it runs in a process pool
+instead of on the event loop. Every worker function in this module must stay
+importable without side effects (no database, no app) because pool workers
+import it on their own.
+
+Uploads reach the workers as paths to spooled files rather than bytes, and
+JPEGs are decoded with `Image.draft`, which lets libjpeg scale by 1/2, 1/4 or
+1/8 while decoding. A 50 MP photo headed for at most 1920px is never held at
+full resolution.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Bump when the processing code changes what it outputs; settings changes are
+# picked up by ImagePipeline.version on their own
+PIPELINE_VERSION = 1
+
+MAIN_MAX_WIDTH = 1200
+THUMB_SIZE = (300, 200)
+
+# Responsive derivatives generated for every upload
+DEFAULT_WIDTHS = (320, 640, 960, 1200, 1920)
+DEFAULT_FORMATS = ("webp", "jpeg")
+
+# format name -> (PIL format, file extension, save options)
+FORMAT_OPTIONS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+class ImageProcessingError(ValueError):
+    """Raised when an uploaded file cannot be decoded or encoded."""
+
+
+class ImagePoolUnavailable(RuntimeError):
+    """Raised when a pool worker died while processing; the next call starts a new pool."""
+
+
+class Derivative(NamedTuple):
+    width: int
+    height: int
+    format: str
+    extension: str
+    content: bytes
+
+
+class ProcessedImage(NamedTuple):
+    main: bytes
+    thumb: bytes
+    derivatives: List[Derivative]
+
+
+def _encode(image: Image.Image, pil_format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _resize_to_width(image: Image.Image, width: int) -> Image.Image:
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def generate_derivatives(image: Image.Image, widths: Sequence[int], formats: Sequence[str]) -> List[Derivative]:
+    """Encode `image` at every width in every format, never upscaling.
+
+    Widths wider than the source collapse to a single derivative at the source
+    width. Each size is resized from the next larger one, largest first, so a
+    huge original is only resampled at full resolution once.
+    """
+    targets = sorted({min(width, image.width) for width in widths}, reverse=True)
+    derivatives = []
+    source = image
+    for width in targets:
+        source = _resize_to_width(source, width)
+        for fmt in formats:
+            pil_format, extension, options = FORMAT_OPTIONS[fmt]
+            content = _encode(source, pil_format, **options)
+            derivatives.append(Derivative(source.width, source.height, fmt, extension, content))
+    return derivatives
+
+
+def _open(source: Union[bytes, str, Path], largest_width: int, draft: bool) -> Image.Image:
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    if draft and image.format == "JPEG" and image.width > largest_width:
+        # draft() keeps the decoded size >= the requested size
+        image.draft("RGB", (largest_width, max(1, image.height * largest_width // image.width)))
+    return image
+
+
+def process_image(
+    source: Union[bytes, str, Path],
+    filename: str,
+    widths: Sequence[int] = (),
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    draft: bool = True,
+) -> ProcessedImage:
+    """Process uploaded image and create thumbnail and responsive derivatives.
+
+    `source` is the file content or a path to it.
+    """
+    try:
+        # Open the image, decoding JPEGs no larger than the largest output needs
+        image = _open(source, max((*widths, MAIN_MAX_WIDTH)), draft)
+
+        # Convert to RGB if necessary
+        if image.mode in ('RGBA', 'P'):
+            image = image.convert('RGB')
+
+        derivatives = generate_derivatives(image, widths, formats)
+
+        # Resize for main image (max 1200px width)
+        image = _resize_to_width(image, MAIN_MAX_WIDTH)
+
+        # Save main image
+        main_content = _encode(image, 'JPEG', quality=85)
+
+        # Create thumbnail (300x200)
+        thumb_image = image.copy()
+        thumb_image.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
+        thumb_content = _encode(thumb_image, 'JPEG', quality=80)
+
+        return ProcessedImage(main_content, thumb_content, derivatives)
+    except Exception as e:
+        # Plain exception type so the error pickles cleanly across the pool;
+        # name the upload, not the spool file
+        message = str(e) if isinstance(source, bytes) else str(e).replace(str(source), filename)
+        raise ImageProcessingError(message) from None
+
+
+def parse_widths(value: str) -> Tuple[int, ...]:
+    return tuple(sorted({int(width) for width in value.split(',') if width.strip()}))
+
+
+def parse_formats(value: str) -> Tuple[str, ...]:
+    formats = [fmt.strip().lower() for fmt in value.split(',') if fmt.strip()]
+    unknown = set(formats) - set(FORMAT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unsupported image formats: {', '.join(sorted(unknown))}")
+    # JPEG is always produced as the universal fallback
+    if "jpeg" not in formats:
+        formats.append("jpeg")
+    return tuple(formats)
+
+
+class ImagePipeline:
+    """Runs `process_image` in a lazily started process pool.
+
+    `workers` defaults to the number of CPUs. With `workers=0` the work runs
+    in the loop's default thread pool, which still keeps the loop responsive
+    but shares the GIL with request handling.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        start_method: str = "spawn",
+        widths: Sequence[int] = DEFAULT_WIDTHS,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+    ):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.start_method = start_method
+        self.widths = tuple(widths)
+        self.formats = tuple(formats)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls) -> "ImagePipeline":
+        workers = os.environ.get('IMAGE_WORKERS')
+        return cls(
+            workers=int(workers) if workers else None,
+            start_method=os.environ.get('IMAGE_POOL_START_METHOD', 'spawn'),
+            widths=parse_widths(os.environ.get('IMAGE_WIDTHS', ','.join(map(str, DEFAULT_WIDTHS)))),
+            formats=parse_formats(os.environ.get('IMAGE_FORMATS', ','.join(DEFAULT_FORMATS))),
+        )
+
+    @property
+    def version(self) -> str:
+        """Identifies the output for a given input: code version plus settings"""
+        settings = repr((self.widths, self.formats, MAIN_MAX_WIDTH, THUMB_SIZE, sorted(FORMAT_OPTIONS.items())))
+        return f"v{PIPELINE_VERSION}.{hashlib.blake2b(settings.encode(), digest_size=4).hexdigest()}"
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+            logger.info("Started image pool with %d %s workers", self.workers, self.start_method)
+        return self._executor
+
+    async def process(self, source: Union[bytes, str, Path], filename: str) -> ProcessedImage:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(
+                executor, process_image, source, filename, self.widths, self.formats
+            )
+        except BrokenProcessPool:
+            # A worker was killed (OOM, codec crash); the pool accepts no more
+            # work, so drop it and let the next call start a fresh one
+            if self._executor is executor:
+                logger.error("Image pool broke while processing %s; restarting it", filename)
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise ImagePoolUnavailable("Image processing worker stopped unexpectedly") from None
+
+    async def process_many(self, items: Sequence[Tuple[Union[bytes, str, Path], str]]) -> List[ProcessedImage]:
+        """Process the files of one upload in parallel, preserving order."""
+        return await asyncio.gather(*(self.process(content, name) for content, name in items))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
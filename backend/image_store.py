@@ -0,0 +1,101 @@
+"""Content-addressed storage of processed vehicle images.
+
+Every upload is hashed while it is spooled. Its derivatives are stored under
+a key made of the content hash and the pipeline version, so re-uploading a
+photo (a corrected listing, a relisted car) reuses the existing files without
+running the pipeline again, and changing the pipeline settings produces new
+keys instead of serving stale derivatives.
+
+The `image_blobs` collection holds one document per key with the stored
+files and a reference count: the number of vehicle images pointing at it.
+Files are removed only when the count drops to zero. Registering a key and
+releasing it take a per-key lock, so a release cannot delete files that a
+concurrent upload of the same content has just written.
+"""
+import asyncio
+import weakref
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
+from image_pipeline import ProcessedImage
+from storage import Storage
+
+KEY_HASH_CHARS = 32  # 128 bits of the sha256
+
+
+def content_key(sha256: str, pipeline_version: str) -> str:
+    return f"{sha256[:KEY_HASH_CHARS]}-{pipeline_version}"
+
+
+class ImageStore:
+    def __init__(self, collection, storage: Storage, url_prefix: str = "/uploads"):
+        self.collection = collection
+        self.storage = storage
+        self.url_prefix = url_prefix
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def acquire(self, key: str) -> Optional[dict]:
+        """Take a reference to an already stored image; None when it must be processed"""
+        return await self.collection.find_one_and_update(
+            {"_id": key, "refcount": {"$gte": 0}}, {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def register(self, key: str, sha256: str, processed: ProcessedImage) -> dict:
+        """Store a freshly processed image and take a reference to it.
+
+        Two uploads of the same new content may both process it; the second
+        rewrites identical files and just adds its reference.
+        """
+        blob = {
+            "main": f"{key}_main.jpg",
+            "thumb": f"{key}_thumb.jpg",
+            "variants": [],
+        }
+        contents = {blob["main"]: processed.main, blob["thumb"]: processed.thumb}
+        for derivative in processed.derivatives:
+            filename = f"{key}_{derivative.width}w.{derivative.extension}"
+            contents[filename] = derivative.content
+            blob["variants"].append({
+                "url": f"{self.url_prefix}/{filename}",
+                "width": derivative.width,
+                "height": derivative.height,
+                "format": derivative.format,
+                "bytes": len(derivative.content),
+            })
+        blob["variants"].sort(key=lambda variant: (variant["format"], variant["width"]))
+
+        async with self._lock(key):
+            await asyncio.gather(*(self.storage.put(name, content) for name, content in contents.items()))
+            return await self.collection.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"refcount": 1},
+                 "$setOnInsert": {**blob, "sha256": sha256, "created_at": datetime.now(timezone.utc)}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+
+    async def release(self, key: str) -> bool:
+        """Drop one reference; returns True when the files were removed"""
+        async with self._lock(key):
+            blob = await self.collection.find_one_and_update(
+                {"_id": key}, {"$inc": {"refcount": -1}}, return_document=ReturnDocument.AFTER
+            )
+            if blob is None or blob["refcount"] > 0:
+                return False
+            result = await self.collection.delete_one({"_id": key, "refcount": {"$lte": 0}})
+            if result.deleted_count == 0:
+                return False  # re-acquired in the meantime
+            await asyncio.gather(*(self.storage.delete(name) for name in blob_filenames(blob)))
+            return True
+
+
+def blob_filenames(blob: dict) -> List[str]:
+    return [blob["main"], blob["thumb"]] + [variant["url"].rsplit("/", 1)[-1] for variant in blob["variants"]]
@@ -0,0 +1,233 @@
+"""Versioned index bootstrap for the Mongo collections.
+
+Indexes are declared as an ordered list of migrations. On startup every
+migration newer than the version recorded in the `migrations` collection is
+applied (index creation is idempotent, so re-running a half-applied migration
+is safe), then the declared indexes are checked against what actually exists.
+In strict mode a missing index refuses startup instead of silently falling
+back to collection scans.
+
+A migration can also carry a one-off data fix (`data`), run after its
+indexes are built. Fixes must be idempotent for the same reason.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "migrations"
+MIGRATION_DOC_ID = "indexes"
+PROGRESS_INTERVAL = 5.0  # seconds between build progress reports
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    create: Dict[str, List[IndexModel]] = {}
+    drop: Dict[str, List[str]] = {}
+    data: Optional[Callable[..., Awaitable]] = None
+
+
+class MissingIndexError(RuntimeError):
+    """Raised in strict mode when a declared index does not exist."""
+
+
+async def promote_primary_images(db):
+    """Mark the first image primary on vehicles that have images but no primary.
+
+    Deleting the primary image used to leave none, and list items only carry
+    the primary image.
+    """
+    result = await db.vehicles.update_many(
+        {"images.0": {"$exists": True}, "images.is_primary": {"$ne": True}},
+        {"$set": {"images.0.is_primary": True}}
+    )
+    logger.info("Promoted a primary image on %d vehicles", result.modified_count)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial route indexes", create={
+        "vehicles": [
+            # get_vehicle, update/delete and image routes
+            IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+            IndexModel([("slug", ASCENDING)], name="slug"),
+            # get_vehicles: default status filter with each sort_by, id as the
+            # keyset pagination tiebreaker
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                       name="status_created_at_id"),
+            IndexModel([("status", ASCENDING), ("price", ASCENDING), ("id", ASCENDING)], name="status_price_id"),
+            IndexModel([("status", ASCENDING), ("year", DESCENDING), ("id", DESCENDING)], name="status_year_id"),
+            IndexModel([("status", ASCENDING), ("kilometers", ASCENDING), ("id", ASCENDING)],
+                       name="status_kilometers_id"),
+            # get_vehicles: equality filters from the catalog UI
+            IndexModel([("vehicle_type", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)],
+                       name="vehicle_type_status_created_at"),
+            IndexModel([("fuel_type", ASCENDING), ("status", ASCENDING), ("price", ASCENDING)],
+                       name="fuel_type_status_price"),
+            IndexModel([("transmission", ASCENDING), ("status", ASCENDING), ("price", ASCENDING)],
+                       name="transmission_status_price"),
+        ],
+        "users": [
+            # get_current_user, login, register
+            IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ],
+        "news": [
+            IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+            IndexModel([("published", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                       name="published_created_at_id"),
+        ],
+        "testimonials": [
+            IndexModel([("published", ASCENDING), ("created_at", DESCENDING)], name="published_created_at"),
+        ],
+        "contact_messages": [
+            IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        ],
+    }),
+    Migration(2, "full-text search", create={
+        "vehicles": [
+            # Text indexes are case and diacritic insensitive, so "electrico"
+            # matches "Eléctrico"; the Spanish stemmer handles plurals
+            IndexModel(
+                [("brand", TEXT), ("model", TEXT), ("features", TEXT), ("description", TEXT)],
+                name="vehicle_text",
+                weights={"brand": 10, "model": 10, "features": 3, "description": 1},
+                default_language="spanish",
+                language_override="search_language",
+            ),
+        ],
+    }),
+    Migration(3, "primary image for vehicles without one", data=promote_primary_images),
+]
+
+
+def declared_indexes(migrations: Sequence[Migration] = MIGRATIONS) -> Dict[str, Dict[str, IndexModel]]:
+    """Indexes that must exist once every migration is applied, per collection."""
+    indexes: Dict[str, Dict[str, IndexModel]] = {}
+    for migration in sorted(migrations, key=lambda m: m.version):
+        for collection, models in migration.create.items():
+            for model in models:
+                indexes.setdefault(collection, {})[model.document["name"]] = model
+        for collection, names in migration.drop.items():
+            for name in names:
+                indexes.get(collection, {}).pop(name, None)
+    return indexes
+
+
+async def _report_build_progress(db, collection: str, index_name: str):
+    """Log the server-side build progress of an index until cancelled"""
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        try:
+            ops = await db.client.admin.aggregate([
+                {"$currentOp": {"allUsers": True}},
+                {"$match": {"command.createIndexes": collection}},
+            ]).to_list(length=None)
+        except Exception:  # currentOp needs privileges we may not have
+            logger.info("Still building index %s.%s", collection, index_name)
+            continue
+        for op in ops:
+            progress = op.get("progress")
+            if progress and progress.get("total"):
+                logger.info("Building index %s.%s: %d/%d (%.0f%%)", collection, index_name,
+                            progress["done"], progress["total"], 100 * progress["done"] / progress["total"])
+            else:
+                logger.info("Building index %s.%s: %s", collection, index_name, op.get("msg", "in progress"))
+
+
+async def _create_index(db, collection: str, model: IndexModel, strict: bool = False) -> bool:
+    """Build one index; outside strict mode a failed build is logged and reported as False"""
+    name = model.document["name"]
+    reporter = asyncio.create_task(_report_build_progress(db, collection, name))
+    started = time.perf_counter()
+    try:
+        await db[collection].create_indexes([model])
+    except OperationFailure as e:
+        # e.g. a unique index over existing duplicates
+        if strict:
+            raise
+        logger.error("Could not build index %s.%s: %s", collection, name, e)
+        return False
+    finally:
+        reporter.cancel()
+    logger.info("Index %s.%s ready in %.2fs", collection, name, time.perf_counter() - started)
+    return True
+
+
+async def current_version(db) -> int:
+    doc = await db[MIGRATIONS_COLLECTION].find_one({"_id": MIGRATION_DOC_ID})
+    return doc["version"] if doc else 0
+
+
+async def apply_migrations(db, migrations: Sequence[Migration] = MIGRATIONS, strict: bool = False) -> int:
+    """Apply pending migrations in order and return the resulting version.
+
+    Outside strict mode an index that fails to build does not stop the
+    migration; it is reported by the missing index check afterwards.
+    """
+    version = await current_version(db)
+    pending = [m for m in sorted(migrations, key=lambda m: m.version) if m.version > version]
+    for migration in pending:
+        total = sum(len(models) for models in migration.create.values())
+        logger.info("Applying index migration %d (%s): %d indexes", migration.version, migration.description, total)
+        done = 0
+        for collection, models in migration.create.items():
+            for model in models:
+                done += 1
+                logger.info("[%d/%d] Creating index %s.%s", done, total, collection, model.document["name"])
+                await _create_index(db, collection, model, strict)
+        for collection, names in migration.drop.items():
+            existing = await db[collection].index_information()
+            for name in names:
+                if name in existing:
+                    logger.info("Dropping index %s.%s", collection, name)
+                    await db[collection].drop_index(name)
+        if migration.data is not None:
+            await migration.data(db)
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": MIGRATION_DOC_ID},
+            {"$set": {"version": migration.version, "description": migration.description}},
+            upsert=True
+        )
+        version = migration.version
+    return version
+
+
+async def missing_indexes(db, migrations: Sequence[Migration] = MIGRATIONS) -> List[Tuple[str, str]]:
+    missing = []
+    for collection, models in declared_indexes(migrations).items():
+        existing = await db[collection].index_information()
+        missing.extend((collection, name) for name in models if name not in existing)
+    return missing
+
+
+async def ensure_indexes(db, auto_create: bool = True, strict: bool = False,
+                         migrations: Sequence[Migration] = MIGRATIONS) -> int:
+    """Startup entry point: migrate (unless disabled) and verify"""
+    if auto_create:
+        version = await apply_migrations(db, migrations, strict)
+    else:
+        version = await current_version(db)
+
+    missing = await missing_indexes(db, migrations)
+    if missing and auto_create:
+        # Indexes dropped by hand after their migration ran
+        declared = declared_indexes(migrations)
+        for collection, name in missing:
+            logger.info("Recreating missing index %s.%s", collection, name)
+            await _create_index(db, collection, declared[collection][name], strict)
+        missing = await missing_indexes(db, migrations)
+
+    if missing:
+        names = ", ".join(f"{collection}.{name}" for collection, name in missing)
+        if strict:
+            raise MissingIndexError(f"Required indexes are missing: {names}")
+        logger.warning("Indexes missing, queries will fall back to collection scans: %s", names)
+    else:
+        logger.info("All declared indexes present (index schema version %d)", version)
+    return version
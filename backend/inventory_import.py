@@ -0,0 +1,279 @@
+"""Streaming bulk import of vehicles from CSV or NDJSON.
+
+The request body is decoded and parsed incrementally, validated row by row
+against `VehicleCreate` and written in `bulk_write` batches, so memory stays
+flat regardless of the file size. Rows with an `id` column upsert that
+vehicle; rows without one insert a new vehicle with a de-duplicated slug.
+"""
+import codecs
+import csv
+import json
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Deque, Dict, List, NamedTuple, Optional, Type, Union
+
+from pydantic import BaseModel, ValidationError
+from pymongo import InsertOne, UpdateOne
+
+MAX_REPORTED_ERRORS = 1000
+# A quoted CSV cell still open after this much input is reported as malformed
+MAX_RECORD_LINES = 1000
+MAX_RECORD_BYTES = 1024 * 1024
+LIST_SEPARATOR = "|"  # CSV cells holding lists, e.g. features
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines, keeping the line endings"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.splitlines(keepends=True) or [""]
+        # splitlines treats a trailing "\r" as complete; wait for a possible "\n"
+        if pending == "" and lines and lines[-1].endswith("\r"):
+            pending = lines.pop()
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class MalformedRecord(NamedTuple):
+    """Stands in for a record that could not be parsed; reported against its row"""
+    message: str
+
+
+class _NeedMoreLines(Exception):
+    pass
+
+
+class _LineFeed:
+    """Line iterator for `csv.reader` that can run dry mid-record.
+
+    The reader starts every record afresh, so when a quoted cell continues
+    past the buffered lines the lines it took are put back and the record is
+    parsed again once more have arrived.
+    """
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+        self.taken: List[str] = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise _NeedMoreLines
+        line = self.lines.popleft()
+        self.taken.append(line)
+        return line
+
+    def rewind(self):
+        self.lines.extendleft(reversed(self.taken))
+        self.taken = []
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Union[dict, MalformedRecord]]:
+    """Parse CSV records with `csv.reader`, including quoted cells that span lines.
+
+    A record the reader rejects, or a quoted cell still open after
+    MAX_RECORD_LINES lines or MAX_RECORD_BYTES (and at the end of the body),
+    becomes a `MalformedRecord`; parsing resumes on the next line.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header: Optional[List[str]] = None
+    retry_at = 0
+
+    def parse(final: bool):
+        nonlocal header, retry_at
+        while feed.lines:
+            feed.taken = []
+            try:
+                row = next(reader)
+            except _NeedMoreLines:
+                open_lines = len(feed.taken)
+                if not final and open_lines < MAX_RECORD_LINES and sum(map(len, feed.taken)) < MAX_RECORD_BYTES:
+                    feed.rewind()
+                    # Parse the open record again once the buffer has doubled, not on every line
+                    retry_at = 2 * open_lines
+                    return
+                feed.rewind()
+                feed.lines.popleft()
+                yield MalformedRecord(f"Unterminated quoted field (open for {open_lines} lines)")
+                continue
+            except csv.Error as e:
+                yield MalformedRecord(str(e))
+                continue
+            if not row or (len(row) == 1 and not row[0].strip()):
+                continue
+            if header is None:
+                header = [name.strip() for name in row]
+                continue
+            yield dict(zip(header, row))
+        retry_at = 0
+
+    async for line in lines:
+        feed.lines.append(line)
+        if len(feed.lines) >= retry_at:
+            for record in parse(final=False):
+                yield record
+    for record in parse(final=True):
+        yield record
+
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield the non-blank lines; decoding happens per row in `parse_ndjson_row`
+    so a malformed line is reported against its row instead of aborting"""
+    async for line in lines:
+        if line.strip():
+            yield line
+
+
+def parse_ndjson_row(line: str) -> dict:
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    return row
+
+
+def coerce_csv_row(row: dict, list_fields=("features",)) -> dict:
+    """CSV cells are all strings: drop empty optional cells and split lists"""
+    coerced = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        value = value.strip()
+        if key in list_fields:
+            coerced[key] = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+        elif value != "":
+            coerced[key] = value
+    return coerced
+
+
+class SlugAllocator:
+    """Hands out slugs that are unique in the collection and in this import.
+
+    Existing suffixes for a base slug are loaded with one anchored regex
+    query per batch, then tracked in memory. `exclude_id` leaves one
+    vehicle's own slug out, for a vehicle being renamed.
+    """
+
+    def __init__(self, collection, exclude_id: Optional[str] = None):
+        self.collection = collection
+        self.exclude_id = exclude_id
+        self._next_suffix: Dict[str, int] = {}
+
+    async def prepare(self, bases: List[str]):
+        missing = sorted({base for base in bases if base not in self._next_suffix})
+        if not missing:
+            return
+        patterns = [re.compile(f"^{re.escape(base)}(-[0-9]+)?$") for base in missing]
+        for base in missing:
+            self._next_suffix[base] = 1
+        query = {"slug": {"$in": patterns}}
+        if self.exclude_id is not None:
+            query["id"] = {"$ne": self.exclude_id}
+        async for document in self.collection.find(query, {"slug": 1, "_id": 0}):
+            slug = document["slug"]
+            for base in missing:
+                if slug == base:
+                    self._next_suffix[base] = max(self._next_suffix[base], 2)
+                elif slug.startswith(base + "-") and slug[len(base) + 1:].isdigit():
+                    self._next_suffix[base] = max(self._next_suffix[base], int(slug[len(base) + 1:]) + 1)
+
+    def allocate(self, base: str) -> str:
+        suffix = self._next_suffix.get(base, 1)
+        self._next_suffix[base] = suffix + 1
+        return base if suffix == 1 else f"{base}-{suffix}"
+
+
+def _format_errors(error: ValidationError) -> List[dict]:
+    return [{"field": ".".join(str(part) for part in item["loc"]), "message": item["msg"]} for item in error.errors()]
+
+
+async def import_vehicles(
+    collection,
+    records: AsyncIterator[Union[dict, str, MalformedRecord]],
+    create_model: Type[BaseModel],
+    vehicle_model: Type[BaseModel],
+    create_slug: Callable[[str, str, int], str],
+    batch_size: int = 500,
+    dry_run: bool = False,
+    row_transform: Optional[Callable[[Union[dict, str]], dict]] = None,
+    on_write: Optional[Callable[[List[str]], None]] = None,
+) -> dict:
+    """Validate and write `records`; return the per-row error report and stats.
+
+    `on_write` is called after every written batch with the ids it updated,
+    so caches are invalidated even if a later batch fails.
+    """
+    started = time.perf_counter()
+    slugs = SlugAllocator(collection)
+    report = {
+        "dry_run": dry_run, "rows": 0, "valid": 0, "invalid": 0,
+        "inserted": 0, "updated": 0, "batches": 0, "errors": [], "errors_truncated": False,
+    }
+    batch: List[tuple] = []
+
+    async def flush():
+        if not batch:
+            return
+        await slugs.prepare([create_slug(v.brand, v.model, v.year) for _, v in batch])
+        operations, updated_ids = [], []
+        now = datetime.now(timezone.utc)
+        for vehicle_id, vehicle in batch:
+            fields = vehicle.dict()
+            slug = slugs.allocate(create_slug(vehicle.brand, vehicle.model, vehicle.year))
+            if vehicle_id is None:
+                document = vehicle_model(**fields, slug=slug).dict()
+                operations.append(InsertOne(document))
+            else:
+                operations.append(UpdateOne(
+                    {"id": vehicle_id},
+                    {"$set": {**fields, "updated_at": now},
+                     "$setOnInsert": {"id": vehicle_id, "slug": slug, "images": [], "created_at": now}},
+                    upsert=True,
+                ))
+                updated_ids.append(vehicle_id)
+        if dry_run:
+            report["inserted"] += sum(isinstance(op, InsertOne) for op in operations)
+        else:
+            result = await collection.bulk_write(operations, ordered=False)
+            report["inserted"] += result.inserted_count + result.upserted_count
+            report["updated"] += result.matched_count
+            if on_write:
+                on_write(updated_ids)
+        report["batches"] += 1
+        batch.clear()
+
+    async for record in records:
+        report["rows"] += 1
+        try:
+            if isinstance(record, MalformedRecord):
+                raise ValueError(record.message)
+            row = row_transform(record) if row_transform else dict(record)
+            vehicle_id = row.pop("id", None) or None
+            vehicle = create_model(**row)
+        except ValueError as e:  # pydantic's ValidationError included
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                errors = _format_errors(e) if isinstance(e, ValidationError) else [{"field": None, "message": str(e)}]
+                report["errors"].append({"row": report["rows"], "errors": errors})
+            else:
+                report["errors_truncated"] = True
+            continue
+        report["valid"] += 1
+        batch.append((str(vehicle_id) if vehicle_id else None, vehicle))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else None
+    return report
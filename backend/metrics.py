@@ -0,0 +1,264 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A small registry of counters, gauges and histograms with labels, plus
+callback families read at scrape time (cache statistics the caches already
+keep). Updates take a per-metric lock because pymongo reports commands from
+its own threads. Values are per process: with several workers, Prometheus
+scrapes each one and sums in the query.
+
+`MetricsMiddleware` times every request under its route template (so ids
+in paths do not create new series) and `MongoCommandMetrics` is a pymongo
+command listener timing every command by collection and operation.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts (not cumulative), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Callback(_Metric):
+    """Values read from `fn` at scrape time: {label values tuple: value}"""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[Tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in self.fn().items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def callback(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[Tuple, float]]):
+        self._metrics[name] = _Callback(name, help, kind, labelnames, fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def register_cache_metrics(registry: Registry, caches: Callable[[], Dict[str, dict]]):
+    """Hit, miss, ratio and size families from `{cache name: stats()}`"""
+    def family(key: str):
+        return lambda: {(name, ): stats.get(key, 0) for name, stats in caches().items()}
+
+    registry.callback("cache_hits_total", "Cache lookups answered from the cache", "counter", ("cache",), family("hits"))
+    registry.callback("cache_misses_total", "Cache lookups that missed", "counter", ("cache",), family("misses"))
+    registry.callback("cache_hit_ratio", "Hits / lookups since start", "gauge", ("cache",), family("hit_ratio"))
+    registry.callback("cache_entries", "Entries currently cached", "gauge", ("cache",), family("entries"))
+
+
+class MetricsMiddleware:
+    """Request latency, in-flight requests and response sizes per route template"""
+
+    def __init__(self, app, router, registry: Registry):
+        self.app = app
+        self.router = router
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "Time to complete a request", ("method", "route", "status")
+        )
+        self.in_flight = registry.gauge("http_requests_in_flight", "Requests being handled", ("method", "route"))
+        self.size = registry.histogram(
+            "http_response_size_bytes", "Response body size", ("method", "route"), buckets=SIZE_BUCKETS
+        )
+
+    def route(self, scope) -> str:
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return route.path
+        # Unknown paths share one series, whatever scanners try
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], self.route(scope)
+        status, size = 500, 0
+        content_length: Optional[int] = None
+
+        async def send_wrapper(message):
+            nonlocal status, size, content_length
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-length":
+                        content_length = int(value)
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec(method, route)
+            self.duration.observe(time.perf_counter() - started, method, route, str(status))
+            # Files sent with pathsend have no body messages
+            self.size.observe(content_length if content_length is not None else size, method, route)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command durations by collection and operation, from pymongo command monitoring"""
+
+    def __init__(self, registry: Registry):
+        self.duration = registry.histogram(
+            "mongodb_command_duration_seconds", "Time for MongoDB to answer a command", ("collection", "command")
+        )
+        self.failures = registry.counter(
+            "mongodb_command_failures_total", "Commands that returned an error", ("collection", "command")
+        )
+        # Only the started event carries the command document
+        self._collections: Dict[Tuple[int, object], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._collections[(event.request_id, event.connection_id)] = target if isinstance(target, str) else ""
+
+    def _finished(self, event) -> str:
+        return self._collections.pop((event.request_id, event.connection_id), "")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.duration.observe(event.duration_micros / 1e6, self._finished(event), event.command_name)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        collection = self._finished(event)
+        self.duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        self.failures.inc(collection, event.command_name)
+
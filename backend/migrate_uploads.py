@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Move uploads from the old flat `uploads/` directory into the configured
+storage backend (STORAGE_BACKEND and friends, see storage.py).
+
+URLs are `/uploads/<name>` in every layout, so no database changes are
+needed, and the app keeps serving unmigrated files from the flat directory:
+the migration can run while the app is up and can be interrupted and resumed.
+
+    python migrate_uploads.py --dry-run
+    python migrate_uploads.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from storage import LocalShardedStorage, storage_from_env
+
+ROOT_DIR = Path(__file__).parent
+
+
+def flat_files(source: Path):
+    with os.scandir(source) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith("."):
+                yield entry.name
+
+
+async def migrate(source: Path, dry_run: bool, limit: int) -> dict:
+    storage = storage_from_env(source)
+    counts = {"moved": 0, "skipped": 0, "failed": 0}
+    for name in flat_files(source):
+        if limit and counts["moved"] >= limit:
+            break
+        if dry_run:
+            counts["moved"] += 1
+            continue
+        try:
+            if isinstance(storage, LocalShardedStorage):
+                moved = storage.migrate_flat(name)
+            else:
+                content = (source / name).read_bytes()
+                await storage.put(name, content)
+                stored = await storage.stat(name)
+                if stored is None or stored.size != len(content):
+                    raise OSError(f"verification failed for {name}")
+                (source / name).unlink()
+                moved = True
+        except OSError as e:
+            print(f"failed: {name}: {e}", file=sys.stderr)
+            counts["failed"] += 1
+            continue
+        counts["moved" if moved else "skipped"] += 1
+        if counts["moved"] % 1000 == 0:
+            print(f"{counts['moved']} files moved")
+    return counts
+
+
+def main():
+    load_dotenv(ROOT_DIR / '.env')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", type=Path, default=ROOT_DIR / "uploads", help="flat uploads directory")
+    parser.add_argument("--dry-run", action="store_true", help="only count the files that would move")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many files")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = asyncio.run(migrate(args.source, args.dry_run, args.limit))
+    verb = "would move" if args.dry_run else "moved"
+    print(f"{verb} {counts['moved']}, skipped {counts['skipped']}, failed {counts['failed']} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor records the sort field, direction and the (value, id) pair of the
+last item on a page. The next page continues strictly after that pair, so the
+query walks the compound `(sort field, id)` index from the right position
+instead of skipping over every earlier document. The token is opaque to
+clients: URL-safe base64 of a small JSON document.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(sort_field: str, direction: int, document: dict) -> str:
+    payload = {
+        "f": sort_field,
+        "d": direction,
+        "v": _encode_value(document.get(sort_field)),
+        "id": document["id"],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> Tuple[Any, str]:
+    """Return the (value, id) position stored in `cursor`.
+
+    A cursor is only valid for the ordering it was issued for; reusing one
+    after changing `sort_by` or `sort_order` is a client error.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value, last_id = _decode_value(payload["v"]), payload["id"]
+        issued_for = (payload["f"], payload["d"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if issued_for != (sort_field, direction):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return value, last_id
+
+
+def encode_offset_cursor(sort_field: str, offset: int) -> str:
+    """Cursor for orderings that cannot be expressed as a range query"""
+    raw = json.dumps({"f": sort_field, "o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_offset_cursor(cursor: str, sort_field: str) -> int:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset, issued_for = int(payload["o"]), payload["f"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if issued_for != sort_field or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return offset
+
+
+def keyset_query(filter_query: dict, sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Combine `filter_query` with the "strictly after cursor" condition"""
+    if not cursor:
+        return filter_query
+    value, last_id = decode_cursor(cursor, sort_field, direction)
+    op = "$gt" if direction == 1 else "$lt"
+    after = {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "id": {op: last_id}},
+    ]}
+    return {"$and": [filter_query, after]} if filter_query else after
+
+
+def keyset_sort(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    """Sort with `id` as tiebreaker so the order is total"""
+    return [(sort_field, direction), ("id", direction)]
+
+
+def next_cursor(documents: List[dict], limit: int, sort_field: str, direction: int) -> Optional[str]:
+    """Cursor for the page after the first `limit` documents.
+
+    Callers fetch `limit + 1` documents; the extra one only tells us whether
+    another page exists, so the last page never returns a dangling cursor.
+    """
+    if len(documents) <= limit:
+        return None
+    return encode_cursor(sort_field, direction, documents[limit - 1])
@@ -0,0 +1,59 @@
+"""Password hashing off the event loop.
+
+bcrypt is deliberately slow (~100-300 ms of CPU per call), so running it in
+an async handler freezes every other request. Hashes run in a small dedicated
+thread pool (bcrypt releases the GIL while it works), and the number of calls
+in flight or queued is capped: once the cap is reached new calls fail
+immediately instead of queueing up behind a login burst or a credential
+stuffing run.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class HashingSaturated(RuntimeError):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """`rounds` is the bcrypt cost for new hashes. Hashes made with another
+    cost still verify, and `verify_and_update` returns a replacement hash for
+    them so they migrate transparently on the next successful login."""
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 32):
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingSaturated(f"{self._pending} password hashes already pending")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Return (valid, new_hash); new_hash is set when the stored hash uses outdated parameters"""
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,241 @@
+"""Pricing analytics for used vehicles (`vehicle_type: "ocasion"`).
+
+The inventory, sold vehicles included, is loaded once into a columnar
+snapshot (one NumPy array per field, categorical fields as integer codes)
+and every statistic is computed over whole columns. The snapshot is kept in
+price order, so grouping prices only takes a stable sort by group code, and
+per-group percentiles are read off the sorted array by index; counts and
+sums come from `np.bincount`. Only the output, one entry per group, is built
+in Python.
+
+The report has, for every brand/model/year group:
+
+- price percentiles and the median price per kilometre;
+- Tukey outliers: prices beyond 1.5 interquartile ranges of their group,
+  only for groups of at least `min_group_size` vehicles;
+
+and, per brand and per brand/model, a depreciation curve (median price by
+model year, relative to the newest year) with the yearly rate of a
+log-linear fit.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+PROJECTION = {"_id": 0, "id": 1, "brand": 1, "model": 1, "year": 1, "price": 1, "kilometers": 1, "status": 1}
+PERCENTILES = (10, 25, 50, 75, 90)
+OUTLIER_IQR_FACTOR = 1.5
+
+
+class PricingSnapshot:
+    """Columns of the vehicles to analyse, rows in ascending price order"""
+
+    def __init__(self, ids: Sequence[str], brands: Sequence[str], models: Sequence[str], years: Sequence[int],
+                 prices: Sequence[float], kilometers: Sequence[float], statuses: Sequence[str]):
+        self.price = np.asarray(prices, dtype=np.float64)
+        order = np.argsort(self.price, kind="stable")
+        self.price = self.price[order]
+        self.ids = np.asarray(ids, dtype=object)[order]
+        self.brand_labels, self.brand = _encode(brands, order)
+        self.model_labels, self.model = _encode(models, order)
+        self.status_labels, self.status = _encode(statuses, order)
+        self.year = np.asarray(years, dtype=np.int64)[order]
+        self.kilometers = np.asarray(kilometers, dtype=np.float64)[order]
+        self.taken_at = datetime.now(timezone.utc)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _encode(values: Sequence[str], order: np.ndarray):
+    """(sorted labels, code of every row)"""
+    positions: Dict[str, int] = {}
+    codes = np.fromiter((positions.setdefault(value or "", len(positions)) for value in values),
+                        dtype=np.int64, count=len(values))
+    labels = sorted(positions)
+    relabel = np.empty(len(labels), dtype=np.int64)
+    relabel[[positions[label] for label in labels]] = np.arange(len(labels))
+    return labels, relabel[codes][order]
+
+
+async def load_snapshot(collection, vehicle_type: str = "ocasion", batch_size: int = 5000) -> PricingSnapshot:
+    columns: Dict[str, list] = {name: [] for name in PROJECTION if name != "_id"}
+    async for document in collection.find({"vehicle_type": vehicle_type}, PROJECTION).batch_size(batch_size):
+        for name, column in columns.items():
+            column.append(document.get(name))
+    return PricingSnapshot(
+        columns["id"], columns["brand"], columns["model"],
+        [year or 0 for year in columns["year"]],
+        [price or 0 for price in columns["price"]],
+        [kilometers or 0 for kilometers in columns["kilometers"]],
+        columns["status"]
+    )
+
+
+def _groups(*keys: np.ndarray):
+    """(group index of every row, one row index per group, number of groups), groups in key order"""
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key in keys:
+        if len(key):
+            key = key - key.min()
+            combined = combined * (int(key.max()) + 1) + key
+    _, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+    return inverse.reshape(-1), first, len(first)
+
+
+def grouped_percentiles(values: np.ndarray, groups: np.ndarray, n_groups: int,
+                        percentiles: Sequence[float] = PERCENTILES, presorted: bool = False) -> np.ndarray:
+    """(n_groups, len(percentiles)) array, linear interpolation like np.percentile; NaN for empty groups.
+
+    With `presorted` (values already ascending) a stable sort by group is
+    enough, and small group codes get numpy's radix sort.
+    """
+    if presorted:
+        order = np.argsort(groups.astype(np.uint16) if n_groups <= 1 << 16 else groups, kind="stable")
+    else:
+        order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    positions = starts[:, None] + np.asarray(percentiles, dtype=np.float64)[None, :] / 100 * np.maximum(counts - 1, 0)[:, None]
+    low = np.floor(positions).astype(np.int64)
+    high = np.ceil(positions).astype(np.int64)
+    result = np.full(positions.shape, np.nan)
+    present = counts > 0
+    if ordered.size:
+        low, high = np.minimum(low, ordered.size - 1), np.minimum(high, ordered.size - 1)
+        interpolated = ordered[low] + (ordered[high] - ordered[low]) * (positions - low)
+        result[present] = interpolated[present]
+    return result
+
+
+def _rates(years: np.ndarray, prices: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Yearly depreciation of a log(price) ~ year least-squares fit per group; NaN without two distinct years"""
+    priced = prices > 0
+    x, y, groups = years[priced].astype(np.float64), np.log(prices[priced]), groups[priced]
+    n = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    sx, sy = np.bincount(groups, x, n_groups), np.bincount(groups, y, n_groups)
+    sxx, sxy = np.bincount(groups, x * x, n_groups), np.bincount(groups, x * y, n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = sxx - sx * sx / n
+        slope = (sxy - sx * sy / n) / variance
+    slope[~(variance > 1e-9)] = np.nan
+    # Newer model years cost more, so the slope is the value lost per year of age
+    return 1 - np.exp(-slope)
+
+
+def _number(value, digits: int = 2) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def _summary(row: np.ndarray, digits: int = 2) -> Dict[str, Optional[float]]:
+    return {f"p{percentile}": _number(value, digits) for percentile, value in zip(PERCENTILES, row)}
+
+
+def pricing_report(snapshot: PricingSnapshot, min_group_size: int = 5, max_outliers: int = 200) -> dict:
+    available = snapshot.status == (
+        snapshot.status_labels.index("available") if "available" in snapshot.status_labels else -1
+    )
+    driven = snapshot.kilometers > 0
+    per_km = np.divide(snapshot.price, snapshot.kilometers, out=np.full(len(snapshot), np.nan), where=driven)
+
+    everything = np.zeros(len(snapshot), dtype=np.int64)
+    overall = grouped_percentiles(snapshot.price, everything, 1, presorted=True)[0]
+    overall_per_km = grouped_percentiles(per_km[driven], everything[driven], 1)[0]
+
+    # brand / model / year groups
+    groups, first, n_groups = _groups(snapshot.brand, snapshot.model, snapshot.year)
+    counts = np.bincount(groups, minlength=n_groups)
+    available_counts = np.bincount(groups, available, n_groups).astype(np.int64)
+    prices = grouped_percentiles(snapshot.price, groups, n_groups, presorted=True)
+    median_per_km = grouped_percentiles(per_km[driven], groups[driven], n_groups, (50,))[:, 0]
+
+    q1, median, q3 = prices[:, 1], prices[:, 2], prices[:, 3]
+    spread = OUTLIER_IQR_FACTOR * (q3 - q1)
+    low_fence, high_fence = (q1 - spread)[groups], (q3 + spread)[groups]
+    flagged = (counts >= min_group_size)[groups] & ((snapshot.price < low_fence) | (snapshot.price > high_fence))
+    outlier_counts = np.bincount(groups, flagged, n_groups).astype(np.int64)
+    rows = np.flatnonzero(flagged)
+    deviation = snapshot.price[rows] / median[groups[rows]] - 1
+    rows = rows[np.argsort(-np.abs(deviation), kind="stable")]
+
+    group_entries = []
+    for group in range(n_groups):
+        row = first[group]
+        group_entries.append({
+            "brand": snapshot.brand_labels[snapshot.brand[row]],
+            "model": snapshot.model_labels[snapshot.model[row]],
+            "year": int(snapshot.year[row]),
+            "count": int(counts[group]),
+            "available": int(available_counts[group]),
+            "price": _summary(prices[group]),
+            "median_price_per_km": _number(median_per_km[group], 4),
+            "outliers": int(outlier_counts[group]),
+        })
+
+    outliers = []
+    for row in rows[:max_outliers]:
+        group = groups[row]
+        outliers.append({
+            "id": snapshot.ids[row],
+            "brand": snapshot.brand_labels[snapshot.brand[row]],
+            "model": snapshot.model_labels[snapshot.model[row]],
+            "year": int(snapshot.year[row]),
+            "price": _number(snapshot.price[row]),
+            "kilometers": int(snapshot.kilometers[row]),
+            "status": snapshot.status_labels[snapshot.status[row]],
+            "group_median": _number(median[group]),
+            "deviation": _number(snapshot.price[row] / median[group] - 1, 4),
+            "direction": "low" if snapshot.price[row] < low_fence[row] else "high",
+        })
+
+    return {
+        "vehicle_type": "ocasion",
+        "total": len(snapshot),
+        "available": int(np.count_nonzero(available)),
+        "price": _summary(overall),
+        "price_per_km": _summary(overall_per_km, 4),
+        "groups": group_entries,
+        "depreciation": {
+            "brands": _depreciation(snapshot, snapshot.brand),
+            "models": _depreciation(snapshot, snapshot.brand, snapshot.model),
+        },
+        "outliers": outliers,
+        "outliers_total": int(np.count_nonzero(flagged)),
+        "min_group_size": min_group_size,
+        "snapshot_at": snapshot.taken_at,
+    }
+
+
+def _depreciation(snapshot: PricingSnapshot, *keys: np.ndarray) -> List[dict]:
+    """Median price by model year within each group of `keys`, newest year = 1.0"""
+    groups, first, n_groups = _groups(*keys)
+    rates = _rates(snapshot.year, snapshot.price, groups, n_groups)
+    points, point_first, n_points = _groups(groups, snapshot.year)
+    point_counts = np.bincount(points, minlength=n_points)
+    point_medians = grouped_percentiles(snapshot.price, points, n_points, (50,), presorted=True)[:, 0]
+    point_groups = groups[point_first]
+    point_years = snapshot.year[point_first]
+    # _groups sorts by (group, year), so each group's newest year is its last point
+    newest = np.full(n_groups, np.nan)
+    newest[point_groups] = point_medians
+
+    curves = []
+    for group in range(n_groups):
+        row = first[group]
+        curve = {"brand": snapshot.brand_labels[snapshot.brand[row]]}
+        if len(keys) > 1:
+            curve["model"] = snapshot.model_labels[snapshot.model[row]]
+        curve["annual_rate"] = _number(rates[group], 4)
+        curve["points"] = []
+        curves.append(curve)
+    for point in range(n_points):
+        group = point_groups[point]
+        curves[group]["points"].append({
+            "year": int(point_years[point]),
+            "count": int(point_counts[point]),
+            "median_price": _number(point_medians[point]),
+            "retention": _number(point_medians[point] / newest[group], 4) if newest[group] else None,
+        })
+    return curves
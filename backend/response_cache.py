@@ -0,0 +1,142 @@
+"""In-process cache of serialized public GET responses.
+
+Entries hold the final JSON bytes plus the headers that go with them, so a
+hit skips Mongo, model validation and serialization entirely. Each entry
+carries tags ("vehicles", "vehicle:<id>", ...) and the admin write routes
+invalidate exactly the tags they affect. Entries also expire after a TTL as a
+safety net for writes made outside the API.
+"""
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from starlette.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+CACHE_HEADER = "X-Cache"
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    headers: Dict[str, str]
+    tags: frozenset
+    expires_at: float
+    size: int
+
+    def to_response(self, status: str = "HIT") -> Response:
+        return Response(content=self.body, media_type=JSON_MEDIA_TYPE, headers={**self.headers, CACHE_HEADER: status})
+
+
+def response_cache_key(route: str, *parts) -> str:
+    """Key from the already-parsed request parameters, so equivalent query
+    strings (reordered, defaults spelled out) share one entry"""
+    return route + ":" + json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class ResponseCache:
+    """TTL + LRU cache bounded by entry count and total bytes.
+
+    `generation` is bumped on every invalidation. Callers capture it before
+    reading from Mongo and pass it to `set`, which drops the entry if a write
+    happened in between, so a slow read can never cache pre-write data.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        # Wall-clock time of the last write per collection-level tag, so the
+        # Last-Modified of a list moves forward when an item is deleted from it
+        self._tag_modified: Dict[str, datetime] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, body: bytes, headers: Dict[str, str], tags: Iterable[str], generation: int) -> CacheEntry:
+        size = len(key) + len(body) + sum(len(k) + len(v) for k, v in headers.items())
+        entry = CacheEntry(body, dict(headers), frozenset(tags), time.monotonic() + self.ttl, size)
+        if not self.enabled or generation != self.generation or size > self.max_bytes:
+            return entry
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.bytes += size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, *tags: str):
+        self.generation += 1
+        now = datetime.now(timezone.utc)
+        for tag in tags:
+            if ":" not in tag:  # per-item tags would grow without bound
+                self._tag_modified[tag] = now
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def last_modified(self, tags: Iterable[str]) -> Optional[datetime]:
+        stamps = [self._tag_modified[tag] for tag in tags if tag in self._tag_modified]
+        return max(stamps, default=None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
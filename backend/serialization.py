@@ -0,0 +1,132 @@
+"""Trusted-read serialization of Mongo documents.
+
+Documents in our collections were written through the same Pydantic models
+that describe the responses, so validating them again on every read is wasted
+work. This module compiles a "shaper" per model that only does what
+validation would visibly change on the wire: fixed field order, defaults for
+fields missing in older documents, dropping `_id` and other extras, numbers
+in the declared numeric type (Mongo keeps an int written to a float field as
+an int, but Pydantic emits 18990.0), and the same treatment for nested
+models. The shaped dict goes straight to orjson (stdlib json when orjson is
+not installed).
+
+The output must stay byte-identical to the Pydantic path; tests/
+test_serialization_contract.py checks that.
+"""
+import json
+import typing
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+Shaper = Callable[[dict], dict]
+
+_shapers: Dict[Type[BaseModel], Shaper] = {}
+
+
+def _nested_model(annotation) -> Tuple[str, Any]:
+    """Classify an annotation as ("model", M), ("list", M) or ("plain", None)"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        # Optional[Model] -> Model; other unions are passed through untouched
+        non_none = [arg for arg in args if arg is not type(None)]
+        if len(non_none) == 1:
+            return _nested_model(non_none[0])
+        return "plain", None
+    if origin in (list, List) and args and isinstance(args[0], type) and issubclass(args[0], BaseModel):
+        return "list", args[0]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return "model", annotation
+    return "plain", None
+
+
+def _to_float(value):
+    return float(value) if type(value) is int else value
+
+
+def _to_int(value):
+    return int(value) if type(value) is float and value.is_integer() else value
+
+
+def _number_coercion(annotation) -> Optional[Callable[[Any], Any]]:
+    """What lax validation does to a number stored in the other numeric type"""
+    if typing.get_origin(annotation) is typing.Union:
+        non_none = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(non_none) == 1:
+            return _number_coercion(non_none[0])
+        return None
+    if annotation is float:
+        return _to_float
+    if annotation is int:
+        return _to_int
+    return None
+
+
+def compile_shaper(model: Type[BaseModel]) -> Shaper:
+    shaper = _shapers.get(model)
+    if shaper is not None:
+        return shaper
+
+    plan = []
+    for name, field in model.model_fields.items():
+        kind, nested = _nested_model(field.annotation)
+        nested_shaper = compile_shaper(nested) if nested is not None else None
+        coerce = _number_coercion(field.annotation)
+        if field.default is not PydanticUndefined:
+            default = field.default
+            factory = None
+        else:
+            default, factory = PydanticUndefined, field.default_factory
+        plan.append((name, kind, nested_shaper, coerce, default, factory))
+
+    def shape(document: dict) -> dict:
+        shaped = {}
+        for name, kind, nested_shaper, coerce, default, factory in plan:
+            if name in document:
+                value = document[name]
+            elif factory is not None:
+                value = factory()
+            elif default is not PydanticUndefined:
+                value = default
+            else:
+                raise KeyError(f"{model.__name__}.{name} missing from trusted document")
+            if value is not None and nested_shaper is not None:
+                value = [nested_shaper(item) for item in value] if kind == "list" else nested_shaper(value)
+            elif coerce is not None:
+                value = coerce(value)
+            shaped[name] = value
+        return shaped
+
+    _shapers[model] = shape
+    return shape
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        # Pydantic writes UTC as "Z"
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode()
+
+
+def dump_document(model: Type[BaseModel], document: dict) -> bytes:
+    return _dumps(compile_shaper(model)(document))
+
+
+def dump_documents(model: Type[BaseModel], documents: Iterable[dict]) -> bytes:
+    shape = compile_shaper(model)
+    return _dumps([shape(document) for document in documents])
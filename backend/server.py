@@ -1,49 +1,182 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Form, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Form, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, MutableMapping, Optional, Tuple, Union
 import uuid
-from datetime import datetime, timezone
-from PIL import Image
-import io
+from datetime import datetime, timedelta, timezone
 import shutil
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 import json
+import secrets
+from image_pipeline import ImagePipeline, ImagePoolUnavailable, ImageProcessingError
+from indexes import ensure_indexes
+from pagination import (
+    CURSOR_HEADER, decode_offset_cursor, encode_offset_cursor, keyset_query, keyset_sort, next_cursor
+)
+from facets import TTLCache, facet_cache_key, facet_pipeline, shape_facets
+from response_cache import CACHE_HEADER, CacheEntry, ResponseCache, response_cache_key
+from http_cache import is_not_modified, latest_timestamp, not_modified_response, validator_headers
+from fieldsets import parse_fields, partial_model, projection_for
+from serialization import dump_document, dump_documents
+from auth_cache import PrincipalCache
+from password_hashing import HashingSaturated, PasswordHasher
+from inventory_import import (
+    SlugAllocator, coerce_csv_row, import_vehicles, iter_csv_records, iter_lines, iter_ndjson_records,
+    parse_ndjson_row
+)
+from exports import MEDIA_TYPES, export_chunks
+import stats
+from write_behind import BufferFull, WriteBehindBuffer
+from uploads import BodySizeLimitMiddleware, ensure_spool_dir, remove_spooled, spool_upload
+from image_store import ImageStore, content_key
+from storage import storage_from_env
+from upload_serving import UploadServer
+from similarity import PROJECTION as SIMILARITY_PROJECTION, SimilarityIndex
+from pricing import load_snapshot, pricing_report
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, MongoCommandMetrics, Registry, register_cache_metrics
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Prometheus metrics at /metrics, sent only with METRICS_TOKEN as a bearer token;
+# without a token the route is a 404 unless METRICS_PUBLIC=1 opts in to open access
+metrics_registry = Registry()
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+
+# MongoDB connection, with command timings by collection and operation
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(metrics_registry)])
 db = client[os.environ['DB_NAME']]
 
 # Create uploads directory
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Dashboard counters are recounted from scratch this often (seconds)
+STATS_RECONCILE_INTERVAL = float(os.environ.get('STATS_RECONCILE_INTERVAL', '3600'))
+
+# Optional write-behind buffering of contact form submissions; each worker
+# spills to CONTACT_SPILL_PATH with its PID added
+contact_buffer = None
+if os.environ.get('CONTACT_WRITE_BEHIND', '0') == '1':
+    contact_buffer = WriteBehindBuffer(
+        db.contact_messages,
+        spill_path=Path(os.environ.get('CONTACT_SPILL_PATH', str(ROOT_DIR / 'contact_messages.spill.ndjson'))),
+        max_batch=int(os.environ.get('CONTACT_FLUSH_BATCH', '100')),
+        flush_interval=float(os.environ.get('CONTACT_FLUSH_INTERVAL', '0.5')),
+        max_pending=int(os.environ.get('CONTACT_MAX_PENDING', '10000')),
+        on_written=lambda documents: stats.apply_inserted(db, "contact_messages", documents)
+    )
+
+# Bulk import
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+
 # Security
 SECRET_KEY = os.environ.get('SECRET_KEY', 'ridauto-motor-secret-key-2025')
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', str(24 * 60)))
+# bcrypt runs in a bounded pool (BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_MAX_PENDING)
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    workers=int(os.environ.get('BCRYPT_WORKERS', '2')),
+    max_pending=int(os.environ.get('BCRYPT_MAX_PENDING', '32'))
+)
 security = HTTPBearer()
 
+# Authenticated users by token, so admin requests skip the users lookup
+principal_cache = PrincipalCache(
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('PRINCIPAL_CACHE_MAX_ENTRIES', '1024'))
+)
+
+# Image processing pool (IMAGE_WORKERS, IMAGE_POOL_START_METHOD)
+image_pipeline = ImagePipeline.from_env()
+image_stage_seconds = metrics_registry.histogram(
+    "image_pipeline_seconds", "Image upload time by stage: spool (per file), process (per batch), store (per image)",
+    ("stage",)
+)
+image_results = metrics_registry.counter(
+    "image_pipeline_images_total", "Uploaded images, processed or reused from identical stored content", ("result",)
+)
+
+# Upload size caps; originals are spooled to disk, never held in memory whole
+UPLOAD_MAX_FILE_BYTES = int(os.environ.get('UPLOAD_MAX_FILE_BYTES', str(25 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get('UPLOAD_MAX_REQUEST_BYTES', str(100 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = ensure_spool_dir(os.environ.get('UPLOAD_SPOOL_DIR'))
+
+# Processed images, shared by content hash and reference counted; STORAGE_BACKEND picks where files live
+storage = storage_from_env(UPLOAD_DIR)
+image_store = ImageStore(db.image_blobs, storage)
+upload_server = UploadServer(storage)
+
+# Catalog facet counts, invalidated on every vehicle write here and expired after
+# FACET_CACHE_TTL seconds for writes made by other workers
+facet_cache = TTLCache(
+    ttl=float(os.environ.get('FACET_CACHE_TTL', '60')),
+    max_entries=int(os.environ.get('FACET_CACHE_SIZE', '256'))
+)
+
+# Pricing analytics snapshot and reports, likewise dropped on every vehicle write here
+# and expired after PRICING_CACHE_TTL seconds for writes made by other workers
+pricing_cache = TTLCache(ttl=float(os.environ.get('PRICING_CACHE_TTL', '300')), max_entries=16)
+
+# Nearest-neighbour index behind /vehicles/{id}/similar; vehicle writes keep it current,
+# and it is rebuilt after SIMILAR_REBUILD_INTERVAL seconds to pick up other workers' writes
+similarity_index = SimilarityIndex(max_age=float(os.environ.get('SIMILAR_REBUILD_INTERVAL', '300')))
+
+# Serialize trusted Mongo documents without re-validating them (TRUSTED_READS=0 to validate)
+TRUSTED_READS = os.environ.get('TRUSTED_READS', '1') == '1'
+
+# Serialized public GET responses, invalidated by tag on admin writes
+response_cache = ResponseCache(
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', '60')),
+    max_entries=int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1024')),
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+)
+
+def cache_stats() -> dict:
+    reused, processed = image_results.value("reused"), image_results.value("processed")
+    return {
+        "responses": response_cache.stats(),
+        "principals": principal_cache.stats(),
+        "facets": facet_cache.stats(),
+        "pricing": pricing_cache.stats(),
+        # Uploads whose content was already stored skip the pipeline
+        "images": {"hits": reused, "misses": processed,
+                   "hit_ratio": reused / (reused + processed) if reused + processed else 0.0},
+    }
+
+register_cache_metrics(metrics_registry, cache_stats)
+
 # Create the main app
 app = FastAPI(title="Ridauto Motor API", description="Professional Automotive Dealership API")
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Serve uploaded files
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# Serve uploaded files from the storage backend; URLs stay flat whatever the layout
+@app.api_route("/uploads/{name}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(name: str, request: Request):
+    return await upload_server.serve(name, request)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    elif not METRICS_PUBLIC:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 # Models
 class User(BaseModel):
@@ -66,11 +199,23 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str  # "webp", "jpeg"
+    bytes: int
+
 class VehicleImage(BaseModel):
     id: str
     filename: str
     url: str
     is_primary: bool = False
+    variants: List[ImageVariant] = []  # srcset candidates, ordered by format then width
+    content_key: Optional[str] = None  # image_blobs key; None for images stored before de-duplication
+
+# Vehicle statuses listed when no status filter is given; "hidden" is left out
+VISIBLE_STATUSES = ("available", "sold")
 
 class Vehicle(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -96,6 +241,29 @@ class Vehicle(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class VehicleSummary(BaseModel):
+    """List item for catalog cards: no description/features, primary image only"""
+    id: str
+    brand: str
+    model: str
+    year: int
+    price: float
+    kilometers: int
+    fuel_type: str
+    transmission: str
+    vehicle_type: str
+    status: str = "available"
+    images: List[VehicleImage] = []
+    slug: str
+    created_at: datetime
+    updated_at: datetime
+
+VEHICLE_SUMMARY_PROJECTION = {
+    **{name: 1 for name in VehicleSummary.model_fields if name != "images"},
+    "images": {"$elemMatch": {"is_primary": True}},
+    "_id": 0
+}
+
 class VehicleCreate(BaseModel):
     brand: str
     model: str
@@ -126,6 +294,24 @@ class VehicleFilter(BaseModel):
     vehicle_type: Optional[str] = None
     status: Optional[str] = None
 
+class FacetCount(BaseModel):
+    value: Union[str, int]
+    count: int
+
+class PriceBucket(BaseModel):
+    min: float
+    max: float
+    count: int
+
+class VehicleFacets(BaseModel):
+    total: int
+    brand: List[FacetCount] = []
+    fuel_type: List[FacetCount] = []
+    transmission: List[FacetCount] = []
+    vehicle_type: List[FacetCount] = []
+    year: List[FacetCount] = []
+    price: List[PriceBucket] = []
+
 class NewsArticle(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -178,31 +364,50 @@ class ContactCreate(BaseModel):
 # Utility functions
 def create_access_token(data: dict):
     to_encode = data.copy()
+    issued_at = datetime.now(timezone.utc)
+    to_encode.update({"iat": issued_at, "exp": issued_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password) -> tuple:
+    """Return (valid, new_hash); new_hash is set when the hash cost changed"""
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except HashingSaturated:
+        raise HTTPException(status_code=503, detail="Too many login attempts, try again shortly",
+                            headers={"Retry-After": "1"})
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    try:
+        return await password_hasher.hash(password)
+    except HashingSaturated:
+        raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
 
 def create_slug(brand: str, model: str, year: int) -> str:
     slug_base = f"{year}-{brand}-{model}".lower().replace(" ", "-")
     return slug_base
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        # Tokens issued before exp/iat were added would otherwise never expire
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM],
+                             options={"require_exp": True, "require_iat": True})
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user = await db.users.find_one({"username": username})
+        user = await db.users.find_one({"username": username}, {"password": 0})
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return User(**user)
+        user_obj = User(**user)
+        principal_cache.set(token, user_obj, username, payload.get("exp"))
+        return user_obj
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
@@ -211,37 +416,210 @@ async def get_admin_user(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
-def process_image(file_content: bytes, filename: str) -> tuple:
-    """Process uploaded image and create thumbnail"""
+async def store_images(files: List[UploadFile]) -> List[dict]:
+    """Spool the uploaded files and return one referenced image_blobs document each.
+
+    Content already stored by the current pipeline is reused as is; the rest
+    is processed in parallel off the event loop.
+    """
+    spooled, acquired = [], []
     try:
-        # Open the image
-        image = Image.open(io.BytesIO(file_content))
-        
-        # Convert to RGB if necessary
-        if image.mode in ('RGBA', 'P'):
-            image = image.convert('RGB')
-        
-        # Resize for main image (max 1200px width)
-        if image.width > 1200:
-            ratio = 1200 / image.width
-            new_height = int(image.height * ratio)
-            image = image.resize((1200, new_height), Image.Resampling.LANCZOS)
+        for file in files:
+            with image_stage_seconds.time("spool"):
+                spooled.append(await spool_upload(file, UPLOAD_MAX_FILE_BYTES, UPLOAD_SPOOL_DIR))
+        keys = [content_key(upload.sha256, image_pipeline.version) for upload in spooled]
+        blobs = []
+        for key in keys:
+            blob = await image_store.acquire(key)
+            if blob is not None:
+                acquired.append(key)
+            blobs.append(blob)
         
-        # Save main image
-        main_buffer = io.BytesIO()
-        image.save(main_buffer, format='JPEG', quality=85)
-        main_content = main_buffer.getvalue()
-        
-        # Create thumbnail (300x200)
-        thumb_image = image.copy()
-        thumb_image.thumbnail((300, 200), Image.Resampling.LANCZOS)
-        thumb_buffer = io.BytesIO()
-        thumb_image.save(thumb_buffer, format='JPEG', quality=80)
-        thumb_content = thumb_buffer.getvalue()
-        
-        return main_content, thumb_content
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+        # Process each missing content once, even if it appears twice in this upload
+        missing = {}
+        for index, (key, blob) in enumerate(zip(keys, blobs)):
+            if blob is None:
+                missing.setdefault(key, index)
+        processed = {}
+        if missing:
+            with image_stage_seconds.time("process"):
+                processed = dict(zip(missing, await image_pipeline.process_many(
+                    [(str(spooled[index].path), files[index].filename) for index in missing.values()]
+                )))
+        for index, key in enumerate(keys):
+            if blobs[index] is None:
+                if missing[key] != index:
+                    # A repeat within this upload: reference what the first copy stored
+                    blobs[index] = await image_store.acquire(key)
+                if blobs[index] is None:
+                    with image_stage_seconds.time("store"):
+                        blobs[index] = await image_store.register(key, spooled[index].sha256, processed[key])
+                acquired.append(key)
+        image_results.inc("processed", amount=len(processed))
+        image_results.inc("reused", amount=len(blobs) - len(processed))
+        return blobs
+    except BaseException as e:
+        for key in acquired:
+            await image_store.release(key)
+        if isinstance(e, ImageProcessingError):
+            raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+        if isinstance(e, ImagePoolUnavailable):
+            raise HTTPException(status_code=503, detail="Image processing is temporarily unavailable, please retry")
+        raise
+    finally:
+        remove_spooled(*spooled)
+
+def primary_image_update(vehicle_id: str, image_id: Optional[str] = None) -> UpdateOne:
+    """Mark `image_id` (default: the first image) primary, only if the vehicle
+    has no primary image; the condition and the write are one atomic update"""
+    query = {"id": vehicle_id, "images.is_primary": {"$ne": True}}
+    if image_id is None:
+        query["images.0"] = {"$exists": True}
+        return UpdateOne(query, {"$set": {"images.0.is_primary": True}})
+    query["images.id"] = image_id
+    return UpdateOne(
+        query, {"$set": {"images.$[primary].is_primary": True}}, array_filters=[{"primary.id": image_id}]
+    )
+
+def add_images_updates(vehicle_id: str, images: List[dict], now: datetime) -> List[UpdateOne]:
+    """Append `images`, then make the first of them primary if the vehicle has
+    none; run ordered in one bulk_write so concurrent uploads cannot lose images"""
+    return [
+        UpdateOne({"id": vehicle_id}, {"$push": {"images": {"$each": images}}, "$set": {"updated_at": now}}),
+        primary_image_update(vehicle_id, images[0]["id"]),
+    ]
+
+def remove_image_update(vehicle_id: str, image_id: str, now: datetime) -> Tuple[dict, dict]:
+    """(filter, update) pulling one image; the filter fails once another request removed it"""
+    return (
+        {"id": vehicle_id, "images.id": image_id},
+        {"$pull": {"images": {"id": image_id}}, "$set": {"updated_at": now}},
+    )
+
+async def release_image(image: dict):
+    """Drop a vehicle image's reference to its stored files"""
+    if image.get('content_key'):
+        await image_store.release(image['content_key'])
+    else:
+        await remove_image_files(image)
+
+async def remove_image_files(image: dict):
+    """Delete an image's main, thumbnail and variant files, ignoring missing ones"""
+    filenames = [image['filename'], image['filename'].replace('_main.jpg', '_thumb.jpg')]
+    filenames += [variant['url'].rsplit('/', 1)[-1] for variant in image.get('variants', [])]
+    await asyncio.gather(*(storage.delete(filename) for filename in filenames))
+
+def build_vehicle_filter(
+    q: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    transmission: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    status: Optional[str] = None
+) -> dict:
+    """Build the vehicle filter query, one top-level key per filtered field"""
+    filter_query = {}
+    
+    if q:
+        filter_query["$text"] = {"$search": q, "$language": "spanish"}
+    if brand:
+        filter_query["brand"] = {"$regex": brand, "$options": "i"}
+    if min_price is not None:
+        filter_query.setdefault("price", {})["$gte"] = min_price
+    if max_price is not None:
+        filter_query.setdefault("price", {})["$lte"] = max_price
+    if min_year is not None:
+        filter_query.setdefault("year", {})["$gte"] = min_year
+    if max_year is not None:
+        filter_query.setdefault("year", {})["$lte"] = max_year
+    if fuel_type:
+        filter_query["fuel_type"] = fuel_type
+    if transmission:
+        filter_query["transmission"] = transmission
+    if vehicle_type:
+        filter_query["vehicle_type"] = vehicle_type
+    if status:
+        filter_query["status"] = status
+    else:
+        # By default, only show available vehicles for public. An equality list
+        # rather than $ne lets the (status, sort field, id) indexes return
+        # documents in sort order (a merge of one index scan per status)
+        filter_query["status"] = {"$in": list(VISIBLE_STATUSES)}
+    
+    return filter_query
+
+async def paginate(collection, filter_query: dict, sort_field: str, sort_direction: int,
+                   cursor: Optional[str], skip: int, limit: int, headers: MutableMapping[str, str],
+                   projection: Optional[dict] = None) -> list:
+    """Fetch one page, by cursor when given, otherwise by the deprecated skip"""
+    cursor_query = collection.find(keyset_query(filter_query, sort_field, sort_direction, cursor), projection)
+    cursor_query = cursor_query.sort(keyset_sort(sort_field, sort_direction))
+    if skip and not cursor:
+        headers["Deprecation"] = "true"
+        cursor_query = cursor_query.skip(skip)
+    documents = await cursor_query.limit(limit + 1).to_list(length=None)
+    token = next_cursor(documents, limit, sort_field, sort_direction)
+    if token:
+        headers[CURSOR_HEADER] = token
+    return documents[:limit]
+
+async def paginate_by_relevance(collection, filter_query: dict, cursor: Optional[str],
+                                skip: int, limit: int, headers: MutableMapping[str, str],
+                                projection: Optional[dict] = None) -> list:
+    """Fetch one page of a $text query ordered by text score.
+
+    The score is computed per query and cannot be range-filtered, so these
+    cursors carry an offset. Text matches are few, so the skip stays short.
+    """
+    if cursor:
+        skip = decode_offset_cursor(cursor, "relevance")
+    elif skip:
+        headers["Deprecation"] = "true"
+    score = {**(projection or {}), "score": {"$meta": "textScore"}}
+    documents = await collection.find(filter_query, score).sort(
+        [("score", {"$meta": "textScore"}), ("id", 1)]
+    ).skip(skip).limit(limit + 1).to_list(length=None)
+    if len(documents) > limit:
+        headers[CURSOR_HEADER] = encode_offset_cursor("relevance", skip + limit)
+    return documents[:limit]
+
+_type_adapters = {}
+
+def render_json(response_type, value) -> bytes:
+    """Serialize `value` exactly as FastAPI would for `response_model=response_type`"""
+    adapter = _type_adapters.get(response_type)
+    if adapter is None:
+        adapter = _type_adapters[response_type] = TypeAdapter(response_type)
+    return adapter.dump_json(value)
+
+def serve_entry(request: Request, entry: CacheEntry, cache_status: str = "HIT") -> Response:
+    """Return the cached response, or a 304 if the client's copy is current"""
+    if is_not_modified(request, entry.headers):
+        return not_modified_response(entry.headers)
+    return entry.to_response(cache_status)
+
+def render_documents(model, documents) -> bytes:
+    """Serialize one Mongo document, or a list of them, as `model` on the wire"""
+    many = isinstance(documents, list)
+    if TRUSTED_READS:
+        return dump_documents(model, documents) if many else dump_document(model, documents)
+    if many:
+        return render_json(List[model], [model(**document) for document in documents])
+    return render_json(model, model(**documents))
+
+def cache_response(request: Request, route: str, cache_key: str, tags: List[str], model, documents,
+                   generation: int, headers: Optional[dict] = None) -> Response:
+    """Serialize a cache miss with its validators, store it and serve it"""
+    body = render_documents(model, documents)
+    items = documents if isinstance(documents, list) else [documents]
+    stamps = [stamp for stamp in (latest_timestamp(items), response_cache.last_modified(tags)) if stamp]
+    headers = {**(headers or {}), **validator_headers(route, body, max(stamps, default=None))}
+    entry = response_cache.set(cache_key, body, headers, tags, generation)
+    return serve_entry(request, entry, "MISS")
 
 # Authentication routes
 @api_router.post("/auth/register", response_model=User)
@@ -254,7 +632,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="User already exists")
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     
     # Create user
     user_dict = user_data.dict()
@@ -263,15 +641,24 @@ async def register(user_data: UserCreate):
     
     # Insert to database
     await db.users.insert_one({**user_obj.dict(), 'password': hashed_password})
+    principal_cache.invalidate_user(user_obj.username)
     return user_obj
 
 @api_router.post("/auth/login", response_model=Token)
 async def login(user_data: UserLogin):
     # Find user
     user = await db.users.find_one({"username": user_data.username})
-    if not user or not verify_password(user_data.password, user['password']):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_password(user_data.password, user['password'])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Transparently upgrade hashes made with an old cost
+    if new_hash:
+        await db.users.update_one({"username": user['username']}, {"$set": {"password": new_hash}})
+        principal_cache.invalidate_user(user['username'])
+    
     # Create token
     access_token = create_access_token(data={"sub": user['username']})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -281,10 +668,14 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Vehicle routes
-@api_router.get("/vehicles", response_model=List[Vehicle])
+@api_router.get("/vehicles", response_model=List[VehicleSummary])
 async def get_vehicles(
-    skip: int = Query(0, ge=0),
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated Vehicle fields instead of the summary"),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = Query(20, ge=1, le=100),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
     brand: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
@@ -294,77 +685,220 @@ async def get_vehicles(
     transmission: Optional[str] = None,
     vehicle_type: Optional[str] = None,
     status: Optional[str] = None,
-    sort_by: str = Query("created_at", regex="^(price|year|kilometers|created_at)$"),
+    sort_by: str = Query("created_at", regex="^(price|year|kilometers|created_at|relevance)$"),
     sort_order: str = Query("desc", regex="^(asc|desc)$")
 ):
-    # Build filter query
-    filter_query = {}
+    filter_query = build_vehicle_filter(
+        q, brand, min_price, max_price, min_year, max_year, fuel_type, transmission, vehicle_type, status
+    )
     
-    if brand:
-        filter_query["brand"] = {"$regex": brand, "$options": "i"}
-    if min_price is not None:
-        filter_query.setdefault("price", {})["$gte"] = min_price
-    if max_price is not None:
-        filter_query.setdefault("price", {})["$lte"] = max_price
-    if min_year is not None:
-        filter_query.setdefault("year", {})["$gte"] = min_year
-    if max_year is not None:
-        filter_query.setdefault("year", {})["$lte"] = max_year
-    if fuel_type:
-        filter_query["fuel_type"] = fuel_type
-    if transmission:
-        filter_query["transmission"] = transmission
-    if vehicle_type:
-        filter_query["vehicle_type"] = vehicle_type
-    if status:
-        filter_query["status"] = status
+    field_names = parse_fields(fields, Vehicle)
+    if field_names:
+        item_model = partial_model(Vehicle, field_names)
+        projection = projection_for(field_names, sort_by if sort_by != "relevance" else "id")
     else:
-        # By default, only show available vehicles for public
-        filter_query["status"] = {"$ne": "hidden"}
+        item_model, projection = VehicleSummary, VEHICLE_SUMMARY_PROJECTION
+    
+    cache_key = response_cache_key("vehicles", filter_query, field_names, sort_by, sort_order, cursor, skip, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    headers = {}
     
     # Build sort query
-    sort_direction = 1 if sort_order == "asc" else -1
-    sort_query = [(sort_by, sort_direction)]
+    if sort_by == "relevance":
+        if not q:
+            raise HTTPException(status_code=400, detail="sort_by=relevance requires q")
+        vehicles = await paginate_by_relevance(db.vehicles, filter_query, cursor, skip, limit, headers, projection)
+    else:
+        sort_direction = 1 if sort_order == "asc" else -1
+        vehicles = await paginate(
+            db.vehicles, filter_query, sort_by, sort_direction, cursor, skip, limit, headers, projection
+        )
     
-    vehicles = await db.vehicles.find(filter_query).sort(sort_query).skip(skip).limit(limit).to_list(length=None)
-    return [Vehicle(**vehicle) for vehicle in vehicles]
+    return cache_response(request, "vehicles", cache_key, ["vehicles"], item_model, vehicles, generation, headers)
+
+@api_router.get("/vehicles/facets", response_model=VehicleFacets)
+async def get_vehicle_facets(
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    transmission: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    status: Optional[str] = None
+):
+    filter_query = build_vehicle_filter(
+        q, brand, min_price, max_price, min_year, max_year, fuel_type, transmission, vehicle_type, status
+    )
+    cache_key = facet_cache_key(filter_query)
+    cached = facet_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    generation = facet_cache.generation
+    result = await db.vehicles.aggregate(facet_pipeline(filter_query)).to_list(length=None)
+    facets = shape_facets(result[0] if result else {})
+    facet_cache.set(cache_key, facets, generation)
+    return facets
 
 @api_router.get("/vehicles/{vehicle_id}", response_model=Vehicle)
-async def get_vehicle(vehicle_id: str):
-    vehicle = await db.vehicles.find_one({"$or": [{"id": vehicle_id}, {"slug": vehicle_id}]})
+async def get_vehicle(
+    vehicle_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated Vehicle fields to return")
+):
+    field_names = parse_fields(fields, Vehicle)
+    item_model = partial_model(Vehicle, field_names) if field_names else Vehicle
+    projection = projection_for(field_names) if field_names else None
+    
+    cache_key = response_cache_key("vehicle", vehicle_id, field_names)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    
+    vehicle = await db.vehicles.find_one({"$or": [{"id": vehicle_id}, {"slug": vehicle_id}]}, projection)
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    return Vehicle(**vehicle)
+    # Tagged by id so writes invalidate lookups made by slug too
+    return cache_response(request, "vehicle", cache_key, [f"vehicle:{vehicle['id']}"], item_model, vehicle, generation)
+
+@api_router.get("/vehicles/{vehicle_id}/similar", response_model=List[VehicleSummary])
+async def get_similar_vehicles(vehicle_id: str, request: Request, limit: int = Query(6, ge=1, le=24)):
+    """Available vehicles closest in price, year, kilometers, power, brand, fuel and transmission"""
+    cache_key = response_cache_key("similar", vehicle_id, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    
+    await similarity_index.refresh(lambda: db.vehicles.find({}, SIMILARITY_PROJECTION).to_list(length=None))
+    if vehicle_id not in similarity_index:
+        # A slug, or a vehicle another worker created since the last build
+        vehicle = await db.vehicles.find_one({"$or": [{"id": vehicle_id}, {"slug": vehicle_id}]}, SIMILARITY_PROJECTION)
+        if not vehicle:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        similarity_index.upsert(vehicle)
+        vehicle_id = vehicle['id']
+    
+    ids = similarity_index.nearest(vehicle_id, limit)
+    vehicles = await db.vehicles.find({"id": {"$in": ids}}, VEHICLE_SUMMARY_PROJECTION).to_list(length=None)
+    rank = {similar_id: position for position, similar_id in enumerate(ids)}
+    vehicles.sort(key=lambda vehicle: rank[vehicle['id']])
+    return cache_response(request, "vehicles", cache_key, ["vehicles"], VehicleSummary, vehicles, generation)
 
 @api_router.post("/vehicles", response_model=Vehicle)
 async def create_vehicle(vehicle_data: VehicleCreate, current_user: User = Depends(get_admin_user)):
     vehicle_dict = vehicle_data.dict()
-    vehicle_dict['slug'] = create_slug(vehicle_data.brand, vehicle_data.model, vehicle_data.year)
+    slugs = SlugAllocator(db.vehicles)
+    base_slug = create_slug(vehicle_data.brand, vehicle_data.model, vehicle_data.year)
+    await slugs.prepare([base_slug])
+    vehicle_dict['slug'] = slugs.allocate(base_slug)
     vehicle_obj = Vehicle(**vehicle_dict)
     
     await db.vehicles.insert_one(vehicle_obj.dict())
+    await stats.apply(db, "vehicles", after=vehicle_dict)
+    similarity_index.upsert(vehicle_obj.dict())
+    facet_cache.invalidate()
+    pricing_cache.invalidate()
+    response_cache.invalidate("vehicles")
     return vehicle_obj
 
+@api_router.post("/vehicles/import")
+async def import_vehicle_inventory(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults from Content-Type"),
+    dry_run: bool = False,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    current_user: User = Depends(get_admin_user)
+):
+    """Bulk upsert vehicles from a CSV or NDJSON request body, streamed row by row.
+
+    Rows with an `id` update (or create) that vehicle; other rows are inserted
+    with a unique slug. Invalid rows are skipped and listed in `errors`.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    lines = iter_lines(request.stream())
+    if format == "csv":
+        records, row_transform = iter_csv_records(lines), coerce_csv_row
+    else:
+        records, row_transform = iter_ndjson_records(lines), parse_ndjson_row
+
+    def invalidate(updated_ids: List[str]):
+        # Inserted rows are not reported back, so the similarity index is rebuilt on next use
+        similarity_index.invalidate()
+        facet_cache.invalidate()
+        pricing_cache.invalidate()
+        response_cache.invalidate("vehicles", *(f"vehicle:{vehicle_id}" for vehicle_id in updated_ids))
+
+    try:
+        return await import_vehicles(
+            db.vehicles, records, VehicleCreate, Vehicle, create_slug,
+            batch_size=batch_size, dry_run=dry_run, row_transform=row_transform, on_write=invalidate
+        )
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable {format} body: {e}")
+    finally:
+        if not dry_run:
+            # Upserts do not report what they replaced; recount instead of tracking deltas
+            await stats.reconcile(db)
+
 @api_router.put("/vehicles/{vehicle_id}", response_model=Vehicle)
 async def update_vehicle(vehicle_id: str, vehicle_data: VehicleCreate, current_user: User = Depends(get_admin_user)):
-    vehicle = await db.vehicles.find_one({"id": vehicle_id})
-    if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    
     vehicle_dict = vehicle_data.dict()
-    vehicle_dict['slug'] = create_slug(vehicle_data.brand, vehicle_data.model, vehicle_data.year)
+    current = await db.vehicles.find_one(
+        {"id": vehicle_id}, {"_id": 0, "brand": 1, "model": 1, "year": 1, "slug": 1}
+    )
+    if not current:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if current.get('slug') and (current.get('brand'), current.get('model'), current.get('year')) == (
+        vehicle_data.brand, vehicle_data.model, vehicle_data.year
+    ):
+        # Keep the URL, including a de-duplicated "-2" suffix
+        vehicle_dict['slug'] = current['slug']
+    else:
+        slugs = SlugAllocator(db.vehicles, exclude_id=vehicle_id)
+        base_slug = create_slug(vehicle_data.brand, vehicle_data.model, vehicle_data.year)
+        await slugs.prepare([base_slug])
+        vehicle_dict['slug'] = slugs.allocate(base_slug)
     vehicle_dict['updated_at'] = datetime.now(timezone.utc)
     
-    await db.vehicles.update_one({"id": vehicle_id}, {"$set": vehicle_dict})
+    # The previous state is needed to move the dashboard counters
+    vehicle = await db.vehicles.find_one_and_update(
+        {"id": vehicle_id}, {"$set": vehicle_dict}, return_document=ReturnDocument.BEFORE
+    )
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    updated_vehicle = {**vehicle, **vehicle_dict}
+    await stats.apply(db, "vehicles", before=vehicle, after=updated_vehicle)
+    similarity_index.upsert(updated_vehicle)
+    facet_cache.invalidate()
+    pricing_cache.invalidate()
+    response_cache.invalidate("vehicles", f"vehicle:{vehicle_id}")
     
-    updated_vehicle = await db.vehicles.find_one({"id": vehicle_id})
     return Vehicle(**updated_vehicle)
 
 @api_router.delete("/vehicles/{vehicle_id}")
 async def delete_vehicle(vehicle_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.vehicles.delete_one({"id": vehicle_id})
-    if result.deleted_count == 0:
+    vehicle = await db.vehicles.find_one_and_delete(
+        {"id": vehicle_id}, projection={"_id": 0, "status": 1, "vehicle_type": 1, "images": 1}
+    )
+    if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
+    await stats.apply(db, "vehicles", before=vehicle)
+    similarity_index.remove(vehicle_id)
+    for image in vehicle.get('images', []):
+        await release_image(image)
+    facet_cache.invalidate()
+    pricing_cache.invalidate()
+    response_cache.invalidate("vehicles", f"vehicle:{vehicle_id}")
     return {"message": "Vehicle deleted"}
 
 # Image upload routes
@@ -374,55 +908,39 @@ async def upload_vehicle_images(
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_admin_user)
 ):
-    vehicle = await db.vehicles.find_one({"id": vehicle_id})
+    vehicle = await db.vehicles.find_one({"id": vehicle_id}, {"_id": 0, "id": 1})
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    uploaded_images = []
-    
     for file in files:
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read file content
-        content = await file.read()
-        
-        # Process image
-        main_content, thumb_content = process_image(content, file.filename)
-        
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        main_filename = f"{file_id}_main.jpg"
-        thumb_filename = f"{file_id}_thumb.jpg"
-        
-        # Save files
-        main_path = UPLOAD_DIR / main_filename
-        thumb_path = UPLOAD_DIR / thumb_filename
-        
-        with open(main_path, 'wb') as f:
-            f.write(main_content)
-        with open(thumb_path, 'wb') as f:
-            f.write(thumb_content)
-        
-        # Create image object
-        image_obj = VehicleImage(
-            id=file_id,
-            filename=main_filename,
-            url=f"/uploads/{main_filename}",
-            is_primary=len(vehicle.get('images', [])) == 0  # First image is primary
-        )
-        
-        uploaded_images.append(image_obj)
     
-    # Update vehicle with new images
-    current_images = vehicle.get('images', [])
-    current_images.extend([img.dict() for img in uploaded_images])
+    blobs = await store_images(files)
     
-    await db.vehicles.update_one(
-        {"id": vehicle_id},
-        {"$set": {"images": current_images, "updated_at": datetime.now(timezone.utc)}}
-    )
+    uploaded_images = [
+        VehicleImage(
+            id=str(uuid.uuid4()),
+            filename=blob["main"],
+            url=f"/uploads/{blob['main']}",
+            is_primary=False,  # assigned atomically below
+            variants=[ImageVariant(**variant) for variant in blob["variants"]],
+            content_key=blob["_id"]
+        )
+        for blob in blobs
+    ]
+    
+    result = await db.vehicles.bulk_write(add_images_updates(
+        vehicle_id, [img.dict() for img in uploaded_images], datetime.now(timezone.utc)
+    ), ordered=True)
+    if result.matched_count == 0:
+        # Deleted while the images were processing
+        for image_obj in uploaded_images:
+            await release_image(image_obj.dict())
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    response_cache.invalidate("vehicles", f"vehicle:{vehicle_id}")
     
+    uploaded_images[0].is_primary = result.modified_count > 1
     return {"message": f"Uploaded {len(uploaded_images)} images", "images": uploaded_images}
 
 @api_router.delete("/vehicles/{vehicle_id}/images/{image_id}")
@@ -431,92 +949,212 @@ async def delete_vehicle_image(
     image_id: str,
     current_user: User = Depends(get_admin_user)
 ):
-    vehicle = await db.vehicles.find_one({"id": vehicle_id})
+    # $pull returns the pre-update document, projected to the removed image,
+    # so only the request that actually removed it deletes the files
+    vehicle = await db.vehicles.find_one_and_update(
+        *remove_image_update(vehicle_id, image_id, datetime.now(timezone.utc)),
+        projection={"_id": 0, "images": {"$elemMatch": {"id": image_id}}},
+        return_document=ReturnDocument.BEFORE
+    )
     if not vehicle:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    
-    images = vehicle.get('images', [])
-    image_to_delete = next((img for img in images if img['id'] == image_id), None)
-    
-    if not image_to_delete:
+        if not await db.vehicles.find_one({"id": vehicle_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Vehicle not found")
         raise HTTPException(status_code=404, detail="Image not found")
     
-    # Remove from filesystem
-    try:
-        os.remove(UPLOAD_DIR / image_to_delete['filename'])
-        thumb_filename = image_to_delete['filename'].replace('_main.jpg', '_thumb.jpg')
-        if os.path.exists(UPLOAD_DIR / thumb_filename):
-            os.remove(UPLOAD_DIR / thumb_filename)
-    except OSError:
-        pass  # File might not exist
-    
-    # Remove from database
-    updated_images = [img for img in images if img['id'] != image_id]
-    await db.vehicles.update_one(
-        {"id": vehicle_id},
-        {"$set": {"images": updated_images, "updated_at": datetime.now(timezone.utc)}}
-    )
+    image_to_delete = vehicle['images'][0]
+    if image_to_delete.get('is_primary'):
+        await db.vehicles.bulk_write([primary_image_update(vehicle_id)])
+    await release_image(image_to_delete)
+    response_cache.invalidate("vehicles", f"vehicle:{vehicle_id}")
     
     return {"message": "Image deleted"}
 
 # News routes
 @api_router.get("/news", response_model=List[NewsArticle])
-async def get_news(skip: int = 0, limit: int = 10):
-    news = await db.news.find({"published": True}).sort([("created_at", -1)]).skip(skip).limit(limit).to_list(length=None)
-    return [NewsArticle(**article) for article in news]
+async def get_news(
+    request: Request,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(10, ge=1, le=100)
+):
+    cache_key = response_cache_key("news", cursor, skip, limit)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    headers = {}
+    
+    news = await paginate(db.news, {"published": True}, "created_at", -1, cursor, skip, limit, headers)
+    return cache_response(request, "news", cache_key, ["news"], NewsArticle, news, generation, headers)
 
 @api_router.get("/news/{article_id}", response_model=NewsArticle)
-async def get_news_article(article_id: str):
+async def get_news_article(article_id: str, request: Request):
+    cache_key = response_cache_key("news_article", article_id)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    
     article = await db.news.find_one({"id": article_id, "published": True})
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
-    return NewsArticle(**article)
+    return cache_response(request, "news_article", cache_key, ["news"], NewsArticle, article, generation)
 
 @api_router.post("/news", response_model=NewsArticle)
 async def create_news(article_data: NewsCreate, current_user: User = Depends(get_admin_user)):
     article_obj = NewsArticle(**article_data.dict())
     await db.news.insert_one(article_obj.dict())
+    response_cache.invalidate("news")
     return article_obj
 
 # Testimonials routes
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials():
+async def get_testimonials(request: Request):
+    cache_key = response_cache_key("testimonials")
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return serve_entry(request, cached)
+    generation = response_cache.generation
+    
     testimonials = await db.testimonials.find({"published": True}).sort([("created_at", -1)]).to_list(length=None)
-    return [Testimonial(**testimonial) for testimonial in testimonials]
+    return cache_response(request, "testimonials", cache_key, ["testimonials"], Testimonial, testimonials, generation)
 
 @api_router.post("/testimonials", response_model=Testimonial)
 async def create_testimonial(testimonial_data: TestimonialCreate, current_user: User = Depends(get_admin_user)):
     testimonial_obj = Testimonial(**testimonial_data.dict())
     await db.testimonials.insert_one(testimonial_obj.dict())
+    response_cache.invalidate("testimonials")
     return testimonial_obj
 
 # Contact routes
 @api_router.post("/contact", response_model=ContactMessage)
 async def create_contact_message(contact_data: ContactCreate):
     contact_obj = ContactMessage(**contact_data.dict())
+    if contact_buffer is not None:
+        # Acknowledged once queued; written in batches by the buffer
+        try:
+            await contact_buffer.submit(contact_obj.dict())
+        except BufferFull:
+            raise HTTPException(status_code=503, detail="Server busy, try again shortly", headers={"Retry-After": "1"})
+        return contact_obj
     await db.contact_messages.insert_one(contact_obj.dict())
+    await stats.apply(db, "contact_messages", after=contact_obj.dict())
     return contact_obj
 
 @api_router.get("/contact", response_model=List[ContactMessage])
-async def get_contact_messages(current_user: User = Depends(get_admin_user), skip: int = 0, limit: int = 50):
-    messages = await db.contact_messages.find().sort([("created_at", -1)]).skip(skip).limit(limit).to_list(length=None)
+async def get_contact_messages(
+    response: Response,
+    current_user: User = Depends(get_admin_user),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(50, ge=1, le=200)
+):
+    messages = await paginate(db.contact_messages, {}, "created_at", -1, cursor, skip, limit, response.headers)
     return [ContactMessage(**message) for message in messages]
 
+# Export routes
+def export_response(cursor, model, format: str, name: str) -> StreamingResponse:
+    extension = "csv" if format == "csv" else "ndjson"
+    filename = f"{name}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{extension}"
+    return StreamingResponse(
+        export_chunks(cursor, model, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/export/vehicles")
+async def export_vehicles(
+    current_user: User = Depends(get_admin_user),
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated Vehicle fields, default all"),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    brand: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    fuel_type: Optional[str] = None,
+    transmission: Optional[str] = None,
+    vehicle_type: Optional[str] = None,
+    status: Optional[str] = None
+):
+    filter_query = build_vehicle_filter(
+        q, brand, min_price, max_price, min_year, max_year, fuel_type, transmission, vehicle_type, status
+    )
+    if status is None:
+        # Exports are admin-only: include hidden vehicles unless a status is requested
+        del filter_query["status"]
+    field_names = parse_fields(fields, Vehicle)
+    model = partial_model(Vehicle, field_names) if field_names else Vehicle
+    projection = projection_for(field_names) if field_names else {"_id": 0}
+    cursor = db.vehicles.find(filter_query, projection).sort("created_at", -1)
+    return export_response(cursor, model, format, "vehicles")
+
+@api_router.get("/export/contact")
+async def export_contact_messages(
+    current_user: User = Depends(get_admin_user),
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated ContactMessage fields, default all"),
+    message_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    filter_query = {}
+    if message_type:
+        filter_query["message_type"] = message_type
+    if since is not None:
+        filter_query.setdefault("created_at", {})["$gte"] = since
+    if until is not None:
+        filter_query.setdefault("created_at", {})["$lt"] = until
+    field_names = parse_fields(fields, ContactMessage)
+    model = partial_model(ContactMessage, field_names) if field_names else ContactMessage
+    projection = projection_for(field_names) if field_names else {"_id": 0}
+    cursor = db.contact_messages.find(filter_query, projection).sort("created_at", -1)
+    return export_response(cursor, model, format, "contact-messages")
+
 # Stats and dashboard routes
 @api_router.get("/stats")
 async def get_stats(current_user: User = Depends(get_admin_user)):
-    total_vehicles = await db.vehicles.count_documents({})
-    available_vehicles = await db.vehicles.count_documents({"status": "available"})
-    sold_vehicles = await db.vehicles.count_documents({"status": "sold"})
-    total_messages = await db.contact_messages.count_documents({})
+    counters = await stats.read(db)
+    vehicles = counters["vehicles"]
+    messages = counters["contact_messages"]
     
     return {
-        "total_vehicles": total_vehicles,
-        "available_vehicles": available_vehicles,
-        "sold_vehicles": sold_vehicles,
-        "total_messages": total_messages
+        "total_vehicles": vehicles["total"],
+        "available_vehicles": vehicles["status"].get("available", 0),
+        "sold_vehicles": vehicles["status"].get("sold", 0),
+        "total_messages": messages["total"],
+        "vehicles_by_status": {key: count for key, count in vehicles["status"].items() if count},
+        "vehicles_by_type": {key: count for key, count in vehicles["vehicle_type"].items() if count},
+        "messages_by_type": {key: count for key, count in messages["message_type"].items() if count},
+        "reconciled_at": counters["reconciled_at"]
     }
 
+@api_router.get("/analytics/pricing")
+async def get_pricing_analytics(
+    min_group_size: int = Query(5, ge=2, le=1000, description="Smallest brand/model/year group checked for outliers"),
+    max_outliers: int = Query(200, ge=0, le=5000),
+    current_user: User = Depends(get_admin_user)
+):
+    """Price percentiles, price per km, depreciation and outliers of used vehicles, sold ones included"""
+    generation = pricing_cache.generation
+    snapshot = pricing_cache.get("snapshot")
+    if snapshot is None:
+        snapshot = await load_snapshot(db.vehicles)
+        pricing_cache.set("snapshot", snapshot, generation)
+    # Reports are keyed by their snapshot, so none is served after its snapshot expired
+    cache_key = f"report:{snapshot.taken_at.isoformat()}:{min_group_size}:{max_outliers}"
+    cached = pricing_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    report = await asyncio.to_thread(pricing_report, snapshot, min_group_size, max_outliers)
+    pricing_cache.set(cache_key, report, generation)
+    return report
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(current_user: User = Depends(get_admin_user)):
+    return cache_stats()
+
 # Initialize admin user
 @api_router.post("/init-admin")
 async def init_admin():
@@ -530,8 +1168,9 @@ async def init_admin():
         is_admin=True
     )
     
-    hashed_password = get_password_hash("admin123")
+    hashed_password = await get_password_hash("admin123")
     await db.users.insert_one({**admin_user.dict(), 'password': hashed_password})
+    principal_cache.invalidate_user(admin_user.username)
     
     return {"message": "Admin user created", "username": "admin", "password": "admin123"}
 
@@ -543,14 +1182,24 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=UPLOAD_MAX_REQUEST_BYTES,
+    path_pattern=r"^/api/vehicles/[^/]+/images$"
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CURSOR_HEADER, CACHE_HEADER, "ETag", "Last-Modified"],
 )
 
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware, router=app.router, registry=metrics_registry)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -558,9 +1207,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    # INDEX_AUTO_CREATE=0 only verifies; INDEX_STRICT=1 refuses to start on missing indexes
+    await ensure_indexes(
+        db,
+        auto_create=os.environ.get('INDEX_AUTO_CREATE', '1') == '1',
+        strict=os.environ.get('INDEX_STRICT', '0') == '1'
+    )
+
+@app.on_event("startup")
+async def start_stats_reconciler():
+    await stats.read(db)  # builds the counters on first start
+    app.state.stats_reconciler = asyncio.create_task(stats.reconcile_periodically(db, STATS_RECONCILE_INTERVAL))
+
+@app.on_event("startup")
+async def start_contact_buffer():
+    if contact_buffer is not None:
+        await contact_buffer.start()  # replays leads spilled by a previous run
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.stats_reconciler.cancel()
+    if contact_buffer is not None:
+        await contact_buffer.close()
     client.close()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,222 @@
+"""In-memory nearest-neighbour index for "similar vehicles".
+
+Every vehicle is a row of features: log price, year, log kilometres and power
+(numeric), plus brand, fuel type and transmission (categorical). Distance is a
+weighted squared Euclidean distance over the numeric features, each scaled by
+its standard deviation across the inventory, plus the categorical part of a
+one-hot encoding. Two one-hot vectors differ by exactly 2 in squared distance
+when a category differs and by 0 when it matches, so instead of a one-hot
+matrix that widens with every new brand each row stores the id of its
+(brand, fuel, transmission) combination; a lookup scores the few distinct
+combinations once and gathers the result.
+
+Arrays are feature-major (one contiguous row per feature) and grow by
+doubling. Writes update single rows in place and deletions swap the last row
+into the gap, so keeping the index current costs O(1) per write. A full build
+happens on first use, after `invalidate` and once `max_age` has passed (to
+pick up writes made by other workers); it runs in a thread while the current
+arrays keep answering, and writes made in the meantime are replayed onto the
+new ones.
+"""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+NUMERIC_FEATURES = ("price", "year", "kilometers", "power_hp")
+CATEGORICAL_FEATURES = ("brand", "fuel_type", "transmission")
+NUMERIC_WEIGHTS = np.array([2.0, 1.0, 1.0, 0.5], dtype=np.float32)
+CATEGORICAL_WEIGHTS = np.array([1.5, 1.0, 0.5], dtype=np.float32)
+SAMPLE_SIZE = 1024  # rows sampled to bound the k-th smallest distance
+
+# Fields the index needs from a vehicle document
+PROJECTION = {name: 1 for name in ("id", "status", *NUMERIC_FEATURES, *CATEGORICAL_FEATURES)}
+PROJECTION["_id"] = 0
+
+
+def _numeric(document: dict) -> List[float]:
+    return [
+        math.log1p(max(float(document.get("price") or 0), 0.0)),
+        float(document.get("year") or 0),
+        math.log1p(max(float(document.get("kilometers") or 0), 0.0)),
+        float(document.get("power_hp") or 0),
+    ]
+
+
+class SimilarityIndex:
+    def __init__(self, capacity: int = 1024, max_age: Optional[float] = None):
+        self.max_age = max_age
+        self.built_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # Writes made while a rebuild is loading, replayed onto the new arrays
+        self._journal: Optional[list] = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.size = 0
+        # Numeric features already multiplied by sqrt(weight) / std
+        self._numeric = np.zeros((len(NUMERIC_FEATURES), capacity), dtype=np.float32)
+        self._scale = np.ones(len(NUMERIC_FEATURES), dtype=np.float32)
+        self._combos = np.zeros(capacity, dtype=np.intp)
+        # 0 for vehicles that may be suggested, inf for the rest
+        self._penalty = np.zeros(capacity, dtype=np.float32)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vocabularies: List[Dict[str, int]] = [{} for _ in CATEGORICAL_FEATURES]
+        self._combo_ids: Dict[Tuple[int, ...], int] = {}
+        self._combo_codes = np.zeros((16, len(CATEGORICAL_FEATURES)), dtype=np.int32)
+
+    @property
+    def built(self) -> bool:
+        return self.built_at is not None
+
+    @property
+    def stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        return self.max_age is not None and time.monotonic() - self.built_at > self.max_age
+
+    def invalidate(self):
+        if self._journal is not None:
+            self._journal.append(("invalidate", None))
+        self.built_at = None
+
+    async def refresh(self, load: Callable[[], Awaitable[list]]):
+        """Rebuild from the documents `load` returns when the index is stale.
+
+        Requests wait for the first build; after that one request rebuilds
+        while the others keep using the current arrays.
+        """
+        if not self.stale or (self.built and self._lock.locked()):
+            return
+        async with self._lock:
+            if not self.stale:
+                return
+            self._journal = []
+            try:
+                fresh = SimilarityIndex(max_age=self.max_age)
+                await asyncio.to_thread(fresh.build, await load())
+                for operation, argument in self._journal:
+                    if operation == "invalidate":
+                        fresh.invalidate()
+                    else:
+                        getattr(fresh, operation)(argument)
+            finally:
+                self._journal = None
+            for name, value in vars(fresh).items():
+                if name not in ("_lock", "_journal"):
+                    setattr(self, name, value)
+
+    def build(self, documents):
+        documents = list(documents)
+        self._allocate(max(1024, len(documents)))
+        for document in documents:
+            self._set_row(self._append_row(document["id"]), document)
+        if self.size > 1:
+            std = self._numeric[:, :self.size].std(axis=1)
+            self._scale = np.sqrt(NUMERIC_WEIGHTS) / np.maximum(std, 1e-6)
+        else:
+            self._scale = np.sqrt(NUMERIC_WEIGHTS)
+        self._numeric[:, :self.size] *= self._scale[:, None]
+        self.built_at = time.monotonic()
+
+    def _combo(self, document: dict) -> int:
+        codes = tuple(
+            self._vocabularies[i].setdefault(str(document.get(name) or "").strip().lower(), len(self._vocabularies[i]))
+            for i, name in enumerate(CATEGORICAL_FEATURES)
+        )
+        combo = self._combo_ids.get(codes)
+        if combo is None:
+            combo = self._combo_ids[codes] = len(self._combo_ids)
+            if combo == len(self._combo_codes):
+                self._combo_codes = np.resize(self._combo_codes, (combo * 2, len(CATEGORICAL_FEATURES)))
+            self._combo_codes[combo] = codes
+        return combo
+
+    def _append_row(self, vehicle_id: str) -> int:
+        if self.size == self._penalty.shape[0]:
+            capacity = self.size * 2
+            self._numeric = np.resize(self._numeric, (len(NUMERIC_FEATURES), capacity))
+            self._combos = np.resize(self._combos, capacity)
+            self._penalty = np.resize(self._penalty, capacity)
+        row = self.size
+        self.size += 1
+        self._ids.append(vehicle_id)
+        self._rows[vehicle_id] = row
+        return row
+
+    def _set_row(self, row: int, document: dict):
+        self._numeric[:, row] = np.array(_numeric(document), dtype=np.float32) * self._scale
+        self._combos[row] = self._combo(document)
+        # Only vehicles for sale are suggested; others can still be looked up
+        self._penalty[row] = 0 if document.get("status", "available") == "available" else np.inf
+
+    def upsert(self, document: dict):
+        """Add or refresh one vehicle; ignored until the index is built"""
+        if self._journal is not None:
+            self._journal.append(("upsert", document))
+        if not self.built:
+            return
+        row = self._rows.get(document["id"])
+        if row is None:
+            row = self._append_row(document["id"])
+        self._set_row(row, document)
+
+    def remove(self, vehicle_id: str):
+        if self._journal is not None:
+            self._journal.append(("remove", vehicle_id))
+        row = self._rows.pop(vehicle_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            # Move the last row into the gap
+            self._numeric[:, row] = self._numeric[:, last]
+            self._combos[row] = self._combos[last]
+            self._penalty[row] = self._penalty[last]
+            moved = self._ids[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        self.size = last
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._rows
+
+    def nearest(self, vehicle_id: str, k: int) -> List[str]:
+        """Ids of the `k` closest eligible vehicles, closest first"""
+        row = self._rows[vehicle_id]
+        n = self.size
+        distances = self._penalty[:n].copy()
+        scratch = np.empty(n, dtype=np.float32)
+        for feature in range(len(NUMERIC_FEATURES)):
+            np.subtract(self._numeric[feature, :n], self._numeric[feature, row], out=scratch)
+            np.multiply(scratch, scratch, out=scratch)
+            distances += scratch
+        combos = self._combo_codes[:len(self._combo_ids)]
+        mismatches = (combos != combos[self._combos[row]]).astype(np.float32)
+        np.take(mismatches @ (2 * CATEGORICAL_WEIGHTS), self._combos[:n], out=scratch)
+        distances += scratch
+        distances[row] = np.inf
+        return [self._ids[i] for i in _smallest(distances, k)]
+
+
+def _smallest(distances: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` smallest finite distances, in order.
+
+    The k-th smallest value of an evenly spaced sample is an upper bound for
+    the k-th smallest overall, so only the rows under it need partitioning.
+    """
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    sample = distances[::max(1, len(distances) // SAMPLE_SIZE)]
+    sample = sample[np.isfinite(sample)]
+    if len(sample) >= k:
+        candidates = np.flatnonzero(distances <= np.partition(sample, k - 1)[k - 1])
+    else:
+        candidates = np.flatnonzero(np.isfinite(distances))
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+    return candidates[np.argsort(distances[candidates], kind="stable")]
@@ -0,0 +1,99 @@
+"""Materialized dashboard counters.
+
+`/api/stats` reads a single document in the `stats` collection instead of
+counting the vehicle and contact collections. Every write that changes those
+collections applies an `$inc` delta to it; `reconcile` recounts everything
+with one aggregation per collection and replaces the document, fixing any
+drift (a crash between a write and its `$inc`, writes made outside the API).
+It runs at startup when the document is missing and then periodically.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = "dashboard"
+
+# collection -> fields counted by value
+COUNTED_FIELDS = {
+    "vehicles": ("status", "vehicle_type"),
+    "contact_messages": ("message_type",),
+}
+
+
+def _key(value) -> str:
+    # Values become field names: keep them free of path separators and operators
+    return str(value).replace(".", "_").lstrip("$") or "_"
+
+
+def delta(collection: str, before: Optional[dict], after: Optional[dict]) -> Dict[str, int]:
+    """`$inc` document turning the counts for `before` into the counts for `after`"""
+    inc: Dict[str, int] = {}
+
+    def add(document: dict, step: int):
+        inc[f"{collection}.total"] = inc.get(f"{collection}.total", 0) + step
+        for field in COUNTED_FIELDS[collection]:
+            path = f"{collection}.{field}.{_key(document.get(field))}"
+            inc[path] = inc.get(path, 0) + step
+
+    if before is not None:
+        add(before, -1)
+    if after is not None:
+        add(after, 1)
+    return {path: step for path, step in inc.items() if step}
+
+
+async def apply(db, collection: str, before: Optional[dict] = None, after: Optional[dict] = None):
+    inc = delta(collection, before, after)
+    if inc:
+        # No upsert: a missing document is rebuilt in full by `read`
+        await db.stats.update_one({"_id": STATS_ID}, {"$inc": inc})
+
+
+async def apply_inserted(db, collection: str, documents):
+    """One `$inc` for a batch of inserted documents"""
+    inc: Dict[str, int] = {}
+    for document in documents:
+        for path, step in delta(collection, None, document).items():
+            inc[path] = inc.get(path, 0) + step
+    if inc:
+        await db.stats.update_one({"_id": STATS_ID}, {"$inc": inc})
+
+
+async def _count(collection, fields) -> dict:
+    facets = {field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}] for field in fields}
+    facets["total"] = [{"$count": "count"}]
+    result = await collection.aggregate([{"$facet": facets}]).to_list(1)
+    counts = result[0] if result else {}
+    shaped = {"total": counts["total"][0]["count"] if counts.get("total") else 0}
+    for field in fields:
+        shaped[field] = {_key(group["_id"]): group["count"] for group in counts.get(field, [])}
+    return shaped
+
+
+async def reconcile(db) -> dict:
+    """Recount from scratch and replace the stats document"""
+    document = {"_id": STATS_ID}
+    for name, fields in COUNTED_FIELDS.items():
+        document[name] = await _count(db[name], fields)
+    document["reconciled_at"] = datetime.now(timezone.utc)
+    await db.stats.replace_one({"_id": STATS_ID}, document, upsert=True)
+    return document
+
+
+async def read(db) -> dict:
+    document = await db.stats.find_one({"_id": STATS_ID})
+    if document is None:
+        document = await reconcile(db)
+    return document
+
+
+async def reconcile_periodically(db, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile(db)
+        except Exception:
+            logger.exception("Stats reconciliation failed")
@@ -0,0 +1,269 @@
+"""Storage backends for uploaded images.
+
+Files are addressed by a flat name (`<key>_main.jpg`) and served under
+`/uploads/<name>` whatever the backend, so stored URLs never change when the
+layout or the backend does.
+
+`LocalShardedStorage` spreads files over two levels of hash-prefix
+directories (`ab/cd/<name>`, 65,536 leaves) so no directory grows past a few
+entries per thousand files. Writes run in a thread and land with a
+temp-file-then-rename, so readers never see a partial file. Files still in
+the old flat layout are found too, until `migrate_uploads.py` moves them.
+
+`ObjectStorage` keeps files in a bucket through a client with the MinIO SDK
+interface (`put_object`, `get_object`, `stat_object`, `remove_object`).
+`LocalObjectStore` is a stand-in client that keeps the bucket on local disk,
+for development and tests; with STORAGE_ENDPOINT set, the real `minio`
+client is used instead.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple, Optional
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class StoredObject(NamedTuple):
+    size: int
+    modified: datetime
+    etag: Optional[str]
+    content_type: str
+
+
+def content_type_for(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class Storage(ABC):
+    """Interface shared by the backends"""
+
+    @abstractmethod
+    async def put(self, name: str, content: bytes):
+        ...
+
+    @abstractmethod
+    async def delete(self, name: str):
+        """Remove `name`; missing files are ignored"""
+
+    @abstractmethod
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        ...
+
+    @abstractmethod
+    def read_chunks(self, name: str) -> AsyncIterator[bytes]:
+        ...
+
+    def local_path(self, name: str) -> Optional[Path]:
+        """Filesystem path when the backend has one, so it can be sent with sendfile"""
+        return None
+
+
+class LocalShardedStorage(Storage):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def shard(name: str) -> str:
+        prefix = hashlib.blake2b(name.encode(), digest_size=2).hexdigest()
+        return f"{prefix[:2]}/{prefix[2:]}"
+
+    def sharded_path(self, name: str) -> Path:
+        return self.root / self.shard(name) / name
+
+    def local_path(self, name: str) -> Optional[Path]:
+        path = self.sharded_path(name)
+        if path.is_file():
+            return path
+        legacy = self.root / name
+        return legacy if legacy.is_file() else None
+
+    def _write(self, name: str, content: bytes):
+        path = self.sharded_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+    async def put(self, name: str, content: bytes):
+        await asyncio.to_thread(self._write, name, content)
+
+    def _delete(self, name: str):
+        for path in (self.sharded_path(name), self.root / name):
+            path.unlink(missing_ok=True)
+
+    async def delete(self, name: str):
+        await asyncio.to_thread(self._delete, name)
+
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        path = self.local_path(name)
+        if path is None:
+            return None
+        info = await asyncio.to_thread(path.stat)
+        modified = datetime.fromtimestamp(info.st_mtime, timezone.utc)
+        return StoredObject(info.st_size, modified, None, content_type_for(name))
+
+    async def read_chunks(self, name: str) -> AsyncIterator[bytes]:
+        path = self.local_path(name)
+        if path is None:
+            return
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, READ_CHUNK_BYTES):
+                yield chunk
+
+    def migrate_flat(self, name: str) -> bool:
+        """Move a file from the old flat layout into its shard"""
+        legacy = self.root / name
+        if not legacy.is_file():
+            return False
+        target = self.sharded_path(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(legacy, target)
+        return True
+
+
+class ObjectStorage(Storage):
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+
+    async def put(self, name: str, content: bytes):
+        await asyncio.to_thread(
+            self.client.put_object, self.bucket, name, io.BytesIO(content), len(content),
+            content_type=content_type_for(name)
+        )
+
+    async def delete(self, name: str):
+        await asyncio.to_thread(self.client.remove_object, self.bucket, name)
+
+    def _stat(self, name: str) -> Optional[StoredObject]:
+        try:
+            info = self.client.stat_object(self.bucket, name)
+        except Exception as e:
+            if getattr(e, "code", None) in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+                return None
+            raise
+        return StoredObject(info.size, info.last_modified, info.etag, info.content_type)
+
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        return await asyncio.to_thread(self._stat, name)
+
+    async def read_chunks(self, name: str) -> AsyncIterator[bytes]:
+        response = await asyncio.to_thread(self.client.get_object, self.bucket, name)
+        try:
+            while chunk := await asyncio.to_thread(response.read, READ_CHUNK_BYTES):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+
+class ObjectNotFound(Exception):
+    code = "NoSuchKey"
+
+
+class _ObjectInfo(NamedTuple):
+    size: int
+    last_modified: datetime
+    etag: str
+    content_type: str
+
+
+class _LocalObjectResponse:
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+
+    def read(self, amount: Optional[int] = None) -> bytes:
+        return self._file.read(amount)
+
+    def close(self):
+        self._file.close()
+
+    def release_conn(self):
+        pass
+
+
+class LocalObjectStore:
+    """MinIO-compatible stand-in keeping buckets on local disk.
+
+    Objects live at `<root>/<bucket>/<name>` with their metadata in a
+    `<name>.meta` sidecar; writes are atomic like a real object PUT.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, bucket: str, name: str) -> Path:
+        if "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid object name: {name}")
+        return self.root / bucket / name
+
+    def put_object(self, bucket: str, name: str, data, length: int, content_type: str = "application/octet-stream"):
+        path = self._path(bucket, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = data.read(length)
+        meta = {"etag": hashlib.md5(content).hexdigest(), "content_type": content_type}
+        for target, payload in ((path, content), (path.with_name(name + ".meta"), json.dumps(meta).encode())):
+            fd, temporary = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(temporary, target)
+
+    def stat_object(self, bucket: str, name: str) -> _ObjectInfo:
+        path = self._path(bucket, name)
+        try:
+            info = path.stat()
+            meta = json.loads(path.with_name(name + ".meta").read_text())
+        except FileNotFoundError:
+            raise ObjectNotFound(name) from None
+        modified = datetime.fromtimestamp(info.st_mtime, timezone.utc)
+        return _ObjectInfo(info.st_size, modified, meta["etag"], meta["content_type"])
+
+    def get_object(self, bucket: str, name: str) -> _LocalObjectResponse:
+        path = self._path(bucket, name)
+        if not path.is_file():
+            raise ObjectNotFound(name)
+        return _LocalObjectResponse(path)
+
+    def remove_object(self, bucket: str, name: str):
+        path = self._path(bucket, name)
+        path.unlink(missing_ok=True)
+        path.with_name(name + ".meta").unlink(missing_ok=True)
+
+
+def storage_from_env(upload_dir: Path) -> Storage:
+    """STORAGE_BACKEND=local (default) or object; see the module docstring"""
+    backend = os.environ.get("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalShardedStorage(upload_dir)
+    if backend != "object":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    bucket = os.environ.get("STORAGE_BUCKET", "uploads")
+    endpoint = os.environ.get("STORAGE_ENDPOINT")
+    if not endpoint:
+        root = Path(os.environ.get("STORAGE_OBJECT_ROOT", str(upload_dir.parent / "object-store")))
+        return ObjectStorage(LocalObjectStore(root), bucket)
+    try:
+        from minio import Minio
+    except ImportError:
+        raise RuntimeError("STORAGE_ENDPOINT requires the minio package") from None
+    client = Minio(
+        endpoint,
+        access_key=os.environ.get("STORAGE_ACCESS_KEY"),
+        secret_key=os.environ.get("STORAGE_SECRET_KEY"),
+        secure=os.environ.get("STORAGE_SECURE", "1") == "1",
+    )
+    return ObjectStorage(client, bucket)
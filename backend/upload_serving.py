@@ -0,0 +1,177 @@
+"""Serving `/uploads/<name>` from the storage backend.
+
+Upload names are unique and their content never changes (content-hash keys,
+older UUID names), so responses carry the long-lived immutable policy from
+http_cache and repeat visitors never go back to the origin. On top of that:
+
+- conditional requests (ETag / Last-Modified) answer 304;
+- a single `Range` answers 206 (several ranges get the whole file, which
+  RFC 9110 allows), honouring `If-Range`;
+- a JPEG or PNG request is answered with an AVIF or WebP sibling of the same
+  name when one is stored and `Accept` lists it, and non-image files with a
+  `.br` / `.gz` precompressed sibling when `Accept-Encoding` allows it;
+- whole local files go out as FileResponse, which uses the server's zero-copy
+  path (`http.response.pathsend`) when it offers one.
+"""
+from collections import OrderedDict
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+from http_cache import cache_policy, http_date, is_not_modified, not_modified_response
+from storage import Storage, StoredObject, content_type_for
+
+# requested suffix -> (media type, sibling suffix), in order of preference
+ALTERNATE_FORMATS = {
+    ".jpg": [("image/avif", ".avif"), ("image/webp", ".webp")],
+    ".jpeg": [("image/avif", ".avif"), ("image/webp", ".webp")],
+    ".png": [("image/avif", ".avif"), ("image/webp", ".webp")],
+}
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+ALREADY_COMPRESSED = ("image/jpeg", "image/png", "image/webp", "image/avif", "image/gif")
+
+
+def _accepted(header: Optional[str]) -> List[str]:
+    """Tokens of an Accept or Accept-Encoding header with a non-zero q"""
+    accepted = []
+    for part in (header or "").split(","):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        q = next((param[2:] for param in params if param.startswith("q=")), "1")
+        try:
+            if token and float(q) > 0:
+                accepted.append(token.lower())
+        except ValueError:
+            continue
+    return accepted
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single satisfiable byte range.
+
+    None means "send the whole file"; ValueError means unsatisfiable (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(end_text)), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+class UploadServer:
+    def __init__(self, storage: Storage, max_cached_names: int = 4096):
+        self.storage = storage
+        self.max_cached_names = max_cached_names
+        # name -> stored alternate names; uploads are immutable, so this only grows stale
+        # when a file is deleted, and a stale entry just falls back to the requested name
+        self._siblings: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+
+    async def _stored_siblings(self, name: str, candidates: Dict[str, str]) -> Dict[str, str]:
+        siblings = self._siblings.get(name)
+        if siblings is None:
+            siblings = {}
+            for token, sibling in candidates.items():
+                if await self.storage.stat(sibling) is not None:
+                    siblings[token] = sibling
+            self._siblings[name] = siblings
+            while len(self._siblings) > self.max_cached_names:
+                self._siblings.popitem(last=False)
+        else:
+            self._siblings.move_to_end(name)
+        return siblings
+
+    async def _negotiate(self, name: str, request: Request) -> Tuple[str, Optional[str], Optional[str]]:
+        """(name to send, Content-Encoding, Vary)"""
+        path = PurePosixPath(name)
+        formats = ALTERNATE_FORMATS.get(path.suffix.lower())
+        if formats:
+            siblings = await self._stored_siblings(name, {media: path.stem + suffix for media, suffix in formats})
+            accepted = _accepted(request.headers.get("accept"))
+            for media, _ in formats:
+                if media in siblings and media in accepted:
+                    return siblings[media], None, "Accept"
+            return name, None, "Accept"
+        if content_type_for(name) not in ALREADY_COMPRESSED:
+            siblings = await self._stored_siblings(name, {coding: name + suffix for coding, suffix in PRECOMPRESSED})
+            accepted = _accepted(request.headers.get("accept-encoding"))
+            for coding, _ in PRECOMPRESSED:
+                if coding in siblings and coding in accepted:
+                    return siblings[coding], coding, "Accept-Encoding"
+            return name, None, "Accept-Encoding"
+        return name, None, None
+
+    async def serve(self, name: str, request: Request) -> Response:
+        if name.startswith("."):
+            return Response(status_code=404)
+        served, encoding, vary = await self._negotiate(name, request)
+        stored = await self.storage.stat(served)
+        if stored is None and served != name:
+            served, encoding = name, None
+            stored = await self.storage.stat(name)
+        if stored is None:
+            return Response(status_code=404)
+
+        headers = self._headers(stored, encoding, vary)
+        if is_not_modified(request, headers):
+            return not_modified_response(headers)
+        media_type = content_type_for(name) if encoding else stored.content_type
+
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if if_range is None or if_range in (headers["ETag"], headers["Last-Modified"]):
+            try:
+                byte_range = parse_range(request.headers.get("range"), stored.size)
+            except ValueError:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{stored.size}"})
+
+        if byte_range is None:
+            path = self.storage.local_path(served)
+            if path is not None:
+                return FileResponse(path, media_type=media_type, headers=headers)
+            headers["Content-Length"] = str(stored.size)
+            return StreamingResponse(self.storage.read_chunks(served), media_type=media_type, headers=headers)
+
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stored.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            self._slice(served, start, end), status_code=206, media_type=media_type, headers=headers
+        )
+
+    async def _slice(self, name: str, start: int, end: int) -> AsyncIterator[bytes]:
+        position = 0
+        async for chunk in self.storage.read_chunks(name):
+            chunk_end = position + len(chunk)
+            if chunk_end > start:
+                yield chunk[max(0, start - position):end + 1 - position]
+            position = chunk_end
+            if position > end:
+                break
+
+    @staticmethod
+    def _headers(stored: StoredObject, encoding: Optional[str], vary: Optional[str]) -> Dict[str, str]:
+        etag = stored.etag or f"{stored.size:x}-{int(stored.modified.timestamp() * 1e6):x}"
+        headers = {
+            "ETag": f'"{etag}"',
+            "Last-Modified": http_date(stored.modified),
+            "Accept-Ranges": "bytes",
+        }
+        policy = cache_policy("uploads")
+        if policy:
+            headers["Cache-Control"] = policy
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if vary:
+            headers["Vary"] = vary
+        return headers
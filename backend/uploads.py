@@ -0,0 +1,130 @@
+"""Size-limited upload ingestion.
+
+`BodySizeLimitMiddleware` caps the request body of upload routes while it
+streams in, so the multipart parser stops spooling and the client gets a 413
+as soon as the cap is crossed. `spool_upload` then copies each part to its own file
+on disk in fixed-size chunks with a per-file cap, so the pipeline workers
+open the image from a path and the original never has to sit in memory.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class SpooledUpload(NamedTuple):
+    path: Path
+    sha256: str
+    size: int
+
+
+class BodySizeLimitMiddleware:
+    """Reject bodies over `max_bytes` on paths matching `path_pattern`"""
+
+    def __init__(self, app, max_bytes: int, path_pattern: str):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_pattern = re.compile(path_pattern)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.path_pattern.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        too_large = PlainTextResponse(f"Request body exceeds {self.max_bytes} bytes", status_code=413)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = replaced = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise BodyTooLarge()
+            return message
+
+        async def limited_send(message):
+            # FastAPI turns body parsing errors into a 400; answer 413 instead
+            nonlocal started, replaced
+            if started or not exceeded:
+                started = started or message["type"] == "http.response.start"
+                await send(message)
+            elif message["type"] == "http.response.start" and not replaced:
+                replaced = True
+                await too_large(scope, receive, send)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except BodyTooLarge:
+            if started:
+                raise
+            if not replaced:
+                await too_large(scope, receive, send)
+
+
+def _copy_limited(source, destination, max_bytes: int):
+    """Copy in chunks, hashing on the way; returns (sha256 hex, size)"""
+    digest = hashlib.sha256()
+    copied = 0
+    while True:
+        chunk = source.read(SPOOL_CHUNK_BYTES)
+        if not chunk:
+            return digest.hexdigest(), copied
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise BodyTooLarge()
+        digest.update(chunk)
+        destination.write(chunk)
+
+
+async def spool_upload(file: UploadFile, max_bytes: int, directory: Optional[Path] = None) -> SpooledUpload:
+    """Copy `file` to a temporary file on disk, hashing its content.
+
+    The caller owns the returned file and must delete it.
+    """
+    fd, name = tempfile.mkstemp(prefix="upload-", dir=directory)
+    path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as destination:
+            await file.seek(0)
+            sha256, size = await run_in_threadpool(_copy_limited, file.file, destination, max_bytes)
+    except BodyTooLarge:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=f"{file.filename} exceeds {max_bytes} bytes")
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return SpooledUpload(path, sha256, size)
+
+
+def remove_spooled(*uploads: SpooledUpload):
+    for upload in uploads:
+        upload.path.unlink(missing_ok=True)
+
+
+def ensure_spool_dir(directory: Optional[str]) -> Optional[Path]:
+    if not directory:
+        return None
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
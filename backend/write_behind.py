@@ -0,0 +1,225 @@
+"""Write-behind buffer for high-volume inserts.
+
+`submit` acknowledges a document as soon as it is queued; a background task
+writes the queue with `insert_many` whenever `max_batch` documents are
+waiting or `flush_interval` seconds have passed. If Mongo rejects a batch
+(unreachable, timing out), the batch is appended to a local NDJSON spill
+file and fsynced, and the spill is replayed once writes succeed again.
+`close` drains the queue, so a clean shutdown loses nothing.
+
+Backpressure: at most `max_pending` documents wait in memory; beyond that
+`submit` raises `BufferFull` and callers should ask the client to retry.
+A replay can re-send documents that were partly written before the failure.
+pymongo assigns `_id` before sending and the spill file keeps it, so those
+come back as duplicate key errors and are skipped.
+
+Each process spills to its own file, `spill_path` with the PID added
+(`contact_messages.spill.1234.ndjson`), so workers sharing a directory
+never replay or remove each other's files. `start` also takes over the
+files of processes that are no longer running.
+"""
+import asyncio
+import glob
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+REPLAY_BACKOFF = 5.0  # seconds between replay attempts after a failed one
+
+
+class BufferFull(RuntimeError):
+    """Raised when the buffer already holds `max_pending` documents."""
+
+
+def _process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running, as another user
+        return True
+    return True
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        collection,
+        spill_path: Path,
+        max_batch: int = 100,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        on_written: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    ):
+        self.collection = collection
+        self.spill_base = Path(spill_path)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_written = on_written
+        self.written = 0
+        self.spilled = 0
+        self.rejected = 0
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._next_replay = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._adopt_orphaned_spills()
+        await self.replay_spill()
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, document: dict):
+        if self._closing or len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            raise BufferFull(f"{len(self._pending)} documents already pending")
+        self._pending.append(document)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # The documents stay queued; retried on the next interval
+                logger.exception("Write-behind flush failed with %d documents pending", len(self._pending))
+
+    async def flush(self):
+        """Write everything queued so far, spilling batches that fail"""
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if not await self._insert(batch):
+                # Keep queueing to disk until Mongo is back; later batches would fail too
+                batch, self._pending = batch + self._pending, []
+                try:
+                    await asyncio.to_thread(self._spill, batch)
+                except BaseException:
+                    # Back to the front of the queue, ahead of anything submitted meanwhile
+                    self._pending[:0] = batch
+                    raise
+                self.spilled += len(batch)
+                return
+        if self._has_spill() and time.monotonic() >= self._next_replay:
+            await self.replay_spill()
+
+    async def _insert(self, batch: List[dict]) -> bool:
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                logger.exception("Write-behind batch of %d documents failed", len(batch))
+                return False
+        except PyMongoError:
+            logger.exception("Write-behind batch of %d documents failed", len(batch))
+            return False
+        self.written += len(batch)
+        if self.on_written is not None:
+            try:
+                await self.on_written(batch)
+            except Exception:
+                logger.exception("Write-behind callback failed")
+        return True
+
+    def _spill(self, batch: List[dict]):
+        with open(self.spill_path, "a", encoding="utf-8") as spill:
+            for document in batch:
+                spill.write(json_util.dumps(document) + "\n")
+            spill.flush()
+            os.fsync(spill.fileno())
+
+    @property
+    def spill_path(self) -> Path:
+        """This process's spill file; read at use, so a buffer created before a fork is still per worker"""
+        base = self.spill_base
+        return base.with_name(f"{base.stem}.{os.getpid()}{base.suffix}")
+
+    def _replay_paths(self) -> List[Path]:
+        """Files this process is replaying: its own spill, and spills adopted from stopped processes"""
+        return sorted(self.spill_base.parent.glob(glob.escape(self.spill_path.name) + "*.replay"))
+
+    def _has_spill(self) -> bool:
+        return self.spill_path.exists() or bool(self._replay_paths())
+
+    def _adopt_orphaned_spills(self):
+        prefix = self.spill_base.stem + "."
+        own = self.spill_path
+        for path in self.spill_base.parent.glob(glob.escape(prefix) + "*"):
+            pid = path.name[len(prefix):].split(".", 1)[0]
+            if not pid.isdigit() or int(pid) == os.getpid() or _process_running(int(pid)):
+                continue
+            try:
+                os.replace(path, own.with_name(f"{own.name}.{path.name}.replay"))
+            except FileNotFoundError:  # adopted by another worker first
+                continue
+            logger.info("Adopted spill file %s of stopped process %s", path.name, pid)
+
+    async def replay_spill(self):
+        """Insert spilled documents; each file is removed only once all of it is written"""
+        while self._has_spill():
+            replays = self._replay_paths()
+            if replays:
+                replaying = replays[0]
+            else:
+                # New failures keep appending to spill_path while this file replays
+                replaying = self.spill_path.with_name(self.spill_path.name + ".replay")
+                os.replace(self.spill_path, replaying)
+            replayed = 0
+            with open(replaying, encoding="utf-8") as spill:
+                batch = []
+                for line in spill:
+                    if line.strip():
+                        batch.append(json_util.loads(line))
+                    if len(batch) >= self.max_batch:
+                        if not await self._insert(batch):
+                            self._next_replay = time.monotonic() + REPLAY_BACKOFF
+                            return
+                        replayed += len(batch)
+                        batch = []
+                if batch and not await self._insert(batch):
+                    self._next_replay = time.monotonic() + REPLAY_BACKOFF
+                    return
+                replayed += len(batch)
+            replaying.unlink()
+            logger.info("Replayed %d spilled documents", replayed)
+
+    async def close(self):
+        """Stop the flusher and write (or spill) everything still queued"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        self._next_replay = 0.0  # last chance to replay before exit
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Write-behind buffer closed with %d documents not written", len(self._pending))
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "spilled": self.spilled,
+            "rejected": self.rejected,
+            "spill_file": self._has_spill(),
+        }
@@ -0,0 +1,51 @@
+import React, { useState, useEffect } from 'react';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+const buildSrcSet = (variants, format) =>
+  variants
+    .filter(variant => variant.format === format)
+    .sort((a, b) => a.width - b.width)
+    .map(variant => `${BACKEND_URL}${variant.url} ${variant.width}w`)
+    .join(', ');
+
+/**
+ * Renders a vehicle image as a <picture> with WebP and JPEG srcsets so the
+ * browser downloads the smallest derivative that fits `sizes`. Images
+ * uploaded before derivatives existed fall back to the plain `url`.
+ */
+const ResponsiveImage = ({ image, sizes = '100vw', alt, className = '', fallbackSrc, ...imgProps }) => {
+  const [failed, setFailed] = useState(false);
+  const src = image ? `${BACKEND_URL}${image.url}` : fallbackSrc;
+
+  // A different image gets a fresh chance to load
+  useEffect(() => {
+    setFailed(false);
+  }, [src]);
+
+  if (!image || (failed && fallbackSrc)) {
+    // Plain <img> without <source>s, so the browser cannot pick a derivative over the fallback
+    return <img src={fallbackSrc} alt={alt} className={className} {...imgProps} />;
+  }
+
+  const variants = image.variants || [];
+  const webpSrcSet = buildSrcSet(variants, 'webp');
+  const jpegSrcSet = buildSrcSet(variants, 'jpeg');
+
+  return (
+    <picture>
+      {webpSrcSet && <source type="image/webp" srcSet={webpSrcSet} sizes={sizes} />}
+      <img
+        src={src}
+        srcSet={jpegSrcSet || undefined}
+        sizes={jpegSrcSet ? sizes : undefined}
+        alt={alt}
+        className={className}
+        onError={() => setFailed(true)}
+        {...imgProps}
+      />
+    </picture>
+  );
+};
+
+export default ResponsiveImage;
@@ -1,12 +1,12 @@
 import React from 'react';
 import { Link } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
+import ResponsiveImage from './ResponsiveImage';
 
 const VehicleCard = ({ vehicle }) => {
   const { t } = useTranslation();
 
   const primaryImage = vehicle.images?.find(img => img.is_primary) || vehicle.images?.[0];
-  const imageUrl = primaryImage ? `${process.env.REACT_APP_BACKEND_URL}${primaryImage.url}` : '/placeholder-car.jpg';
 
   const formatPrice = (price) => {
     return new Intl.NumberFormat('es-ES', {
@@ -25,13 +25,12 @@ const VehicleCard = ({ vehicle }) => {
     <div className="card hover-lift">
       {/* Vehicle Image */}
       <Link to={`/vehiculos/${vehicle.slug}`} className="card-image relative">
-        <img
-          src={imageUrl}
+        <ResponsiveImage
+          image={primaryImage}
+          sizes="(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 33vw"
           alt={`${vehicle.brand} ${vehicle.model}`}
+          fallbackSrc="/placeholder-car.jpg"
           loading="lazy"
-          onError={(e) => {
-            e.target.src = '/placeholder-car.jpg';
-          }}
         />
         
         {/* Status Badge */}
@@ -19,6 +19,7 @@ export const VehicleProvider = ({ children }) => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [filters, setFilters] = useState({
+    q: '',
     brand: '',
     min_price: '',
     max_price: '',
@@ -31,7 +32,7 @@ export const VehicleProvider = ({ children }) => {
   });
   const [sortBy, setSortBy] = useState('created_at');
   const [sortOrder, setSortOrder] = useState('desc');
-  const [currentPage, setCurrentPage] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [hasMore, setHasMore] = useState(true);
 
   const fetchVehicles = async (reset = false, customFilters = null, customSort = null) => {
@@ -44,12 +45,17 @@ export const VehicleProvider = ({ children }) => {
       const activeSortOrder = customSort?.sortOrder || sortOrder;
       
       const params = {
-        skip: reset ? 0 : currentPage * 20,
         limit: 20,
         sort_by: activeSortBy,
         sort_order: activeSortOrder
       };
 
+      // Continue after the last vehicle we have instead of counting pages,
+      // so inventory changes between requests cannot duplicate or skip items
+      if (!reset && nextCursor) {
+        params.cursor = nextCursor;
+      }
+
       // Add filters to params
       Object.keys(activeFilters).forEach(key => {
         if (activeFilters[key] && activeFilters[key] !== '') {
@@ -59,16 +65,16 @@ export const VehicleProvider = ({ children }) => {
 
       const response = await axios.get(`${API}/vehicles`, { params });
       const newVehicles = response.data;
+      const cursor = response.headers['x-next-cursor'] || null;
 
       if (reset) {
         setVehicles(newVehicles);
-        setCurrentPage(1);
       } else {
         setVehicles(prev => [...prev, ...newVehicles]);
-        setCurrentPage(prev => prev + 1);
       }
 
-      setHasMore(newVehicles.length === 20);
+      setNextCursor(cursor);
+      setHasMore(Boolean(cursor));
     } catch (err) {
       console.error('Error fetching vehicles:', err);
       setError(err.response?.data?.detail || 'Error loading vehicles');
@@ -89,19 +95,20 @@ export const VehicleProvider = ({ children }) => {
 
   const updateFilters = (newFilters) => {
     setFilters(prev => ({ ...prev, ...newFilters }));
-    setCurrentPage(0);
+    setNextCursor(null);
     fetchVehicles(true, { ...filters, ...newFilters });
   };
 
   const updateSort = (newSortBy, newSortOrder = 'desc') => {
     setSortBy(newSortBy);
     setSortOrder(newSortOrder);
-    setCurrentPage(0);
+    setNextCursor(null);
     fetchVehicles(true, filters, { sortBy: newSortBy, sortOrder: newSortOrder });
   };
 
   const resetFilters = () => {
     const defaultFilters = {
+      q: '',
       brand: '',
       min_price: '',
       max_price: '',
@@ -113,7 +120,7 @@ export const VehicleProvider = ({ children }) => {
       status: 'available'
     };
     setFilters(defaultFilters);
-    setCurrentPage(0);
+    setNextCursor(null);
     fetchVehicles(true, defaultFilters);
   };
 
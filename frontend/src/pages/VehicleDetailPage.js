@@ -3,6 +3,7 @@ import { useParams, Link } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import PageLayout from '../components/Layout/PageLayout';
 import LoadingSpinner from '../components/LoadingSpinner';
+import ResponsiveImage from '../components/ResponsiveImage';
 import { useVehicles } from '../context/VehicleContext';
 
 const VehicleDetailPage = () => {
@@ -99,8 +100,9 @@ const VehicleDetailPage = () => {
                         VENDIDO
                       </div>
                     )}
-                    <img
-                      src={`${process.env.REACT_APP_BACKEND_URL}${images[currentImageIndex]?.url}`}
+                    <ResponsiveImage
+                      image={images[currentImageIndex]}
+                      sizes="(max-width: 1024px) 100vw, 50vw"
                       alt={`${vehicle.brand} ${vehicle.model}`}
                       className="w-full h-96 object-cover"
                     />
@@ -139,10 +141,12 @@ const VehicleDetailPage = () => {
                             index === currentImageIndex ? 'border-ridauto-primary' : 'border-gray-200'
                           }`}
                         >
-                          <img
-                            src={`${process.env.REACT_APP_BACKEND_URL}${image.url}`}
+                          <ResponsiveImage
+                            image={image}
+                            sizes="160px"
                             alt={`${vehicle.brand} ${vehicle.model} ${index + 1}`}
                             className="w-full h-20 object-cover"
+                            loading="lazy"
                           />
                         </button>
                       ))}
@@ -102,6 +102,18 @@ const VehiclesPage = () => {
                     </button>
                   </div>
 
+                  {/* Text Search */}
+                  <div className="form-group">
+                    <label className="form-label">Buscar</label>
+                    <input
+                      type="search"
+                      placeholder="Marca, modelo, equipamiento..."
+                      value={filters.q || ''}
+                      onChange={(e) => handleFilterChange('q', e.target.value)}
+                      className="form-input"
+                    />
+                  </div>
+
                   {/* Brand Filter */}
                   <div className="form-group">
                     <label className="form-label">Marca</label>
@@ -0,0 +1,9 @@
+"""Shared test setup: import the backend modules directly and give server.py
+the settings it reads at import time (nothing connects until a test does)."""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
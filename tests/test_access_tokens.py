@@ -0,0 +1,35 @@
+"""Access tokens must carry an expiry; tokens from before exp/iat existed are refused."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+import server
+
+
+def rejected(token: str) -> HTTPException:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_current_user(credentials))
+    return error.value
+
+
+@pytest.mark.parametrize("claims", [
+    {"sub": "admin"},  # as issued before this series
+    {"sub": "admin", "iat": datetime.now(timezone.utc)},
+    {"sub": "admin", "exp": datetime.now(timezone.utc) + timedelta(hours=1)},
+])
+def test_token_without_expiry_claims_is_rejected(claims):
+    token = jwt.encode(claims, server.SECRET_KEY, algorithm=server.ALGORITHM)
+    assert rejected(token).status_code == 401
+    assert server.principal_cache.get(token) is None
+
+
+def test_expired_token_is_rejected():
+    issued_at = datetime.now(timezone.utc) - timedelta(days=2)
+    token = jwt.encode({"sub": "admin", "iat": issued_at, "exp": issued_at + timedelta(days=1)},
+                       server.SECRET_KEY, algorithm=server.ALGORITHM)
+    assert rejected(token).status_code == 401
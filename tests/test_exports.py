@@ -0,0 +1,47 @@
+"""CSV exports must not hand spreadsheet formulas from public form input to the admin."""
+import asyncio
+import csv
+import io
+
+import server
+from exports import csv_chunks
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+def export_csv(model, documents) -> list:
+    async def collect():
+        return b"".join([chunk async for chunk in csv_chunks(Cursor(documents), model)])
+    return list(csv.DictReader(io.StringIO(asyncio.run(collect()).decode())))
+
+
+def test_formula_cells_in_a_lead_are_exported_as_text():
+    lead = server.ContactMessage(
+        name="=HYPERLINK(\"http://x\",\"Click\")", email="@SUM(1+1)@example.com", phone="+34 600 000 000",
+        message="-2+3", message_type="\tcontact",
+    ).model_dump()
+    row, = export_csv(server.ContactMessage, [lead])
+    assert row["name"] == "'=HYPERLINK(\"http://x\",\"Click\")"
+    assert row["email"] == "'@SUM(1+1)@example.com"
+    assert row["phone"] == "'+34 600 000 000"
+    assert row["message"] == "'-2+3"
+    assert row["message_type"] == "'\tcontact"
+    assert row["id"] == lead["id"]
+
+
+def test_plain_cells_are_unchanged():
+    lead = server.ContactMessage(name="Lucía", email="lucia@example.com", message="Me interesa el coche").model_dump()
+    row, = export_csv(server.ContactMessage, [lead])
+    assert (row["name"], row["email"], row["message"], row["phone"]) == (
+        "Lucía", "lucia@example.com", "Me interesa el coche", ""
+    )
@@ -0,0 +1,157 @@
+"""Image array updates: the exact update documents, and concurrent uploads
+and deletes against a real MongoDB.
+
+The MongoDB tests are skipped when no server answers at MONGO_URL; each run
+uses a throwaway database.
+"""
+import asyncio
+import io
+import os
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from PIL import Image
+from pymongo import UpdateOne
+
+import server
+from image_pipeline import ImagePipeline
+from image_store import ImageStore, blob_filenames
+from storage import LocalShardedStorage
+
+PARALLEL_UPLOADS = 8
+FILES_PER_UPLOAD = 2
+NOW = datetime(2025, 3, 14, 9, 26, 53, tzinfo=timezone.utc)
+
+
+def jpeg_bytes(color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_add_images_pushes_then_promotes_the_first_new_image():
+    images = [{"id": "img-1", "is_primary": False}, {"id": "img-2", "is_primary": False}]
+    assert server.add_images_updates("v1", images, NOW) == [
+        UpdateOne({"id": "v1"}, {"$push": {"images": {"$each": images}}, "$set": {"updated_at": NOW}}),
+        UpdateOne(
+            {"id": "v1", "images.is_primary": {"$ne": True}, "images.id": "img-1"},
+            {"$set": {"images.$[primary].is_primary": True}},
+            array_filters=[{"primary.id": "img-1"}],
+        ),
+    ]
+
+
+def test_remove_image_pulls_only_an_image_still_present():
+    assert server.remove_image_update("v1", "img-1", NOW) == (
+        {"id": "v1", "images.id": "img-1"},
+        {"$pull": {"images": {"id": "img-1"}}, "$set": {"updated_at": NOW}},
+    )
+
+
+def test_set_primary_only_applies_to_vehicles_without_one():
+    assert server.primary_image_update("v1") == UpdateOne(
+        {"id": "v1", "images.is_primary": {"$ne": True}, "images.0": {"$exists": True}},
+        {"$set": {"images.0.is_primary": True}},
+    )
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """Point the app at a fresh database; yields a coroutine runner"""
+    state = {}
+
+    async def setup():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            pytest.skip(f"no MongoDB at {os.environ['MONGO_URL']}")
+        state["client"] = client
+        state["db"] = client[f"test_images_{uuid.uuid4().hex[:8]}"]
+        monkeypatch.setattr(server, "db", state["db"])
+        monkeypatch.setattr(server, "image_store", ImageStore(state["db"].image_blobs, storage))
+
+    def run(test):
+        async def wrapped():
+            await setup()
+            try:
+                await test(state["db"])
+            finally:
+                await state["client"].drop_database(state["db"].name)
+                state["client"].close()
+        asyncio.run(wrapped())
+
+    storage = LocalShardedStorage(tmp_path)
+    monkeypatch.setattr(server, "storage", storage)
+    monkeypatch.setattr(server, "image_pipeline", ImagePipeline(workers=0))
+    server.app.dependency_overrides[server.get_admin_user] = lambda: server.User(
+        username="admin", email="admin@example.com", is_admin=True
+    )
+    server.response_cache.clear()
+    yield run
+    server.app.dependency_overrides.clear()
+
+
+async def create_vehicle(db) -> str:
+    vehicle = server.Vehicle(
+        brand="Seat", model="Leon", year=2020, price=15000, kilometers=30000, fuel_type="Gasolina",
+        transmission="Manual", color="Rojo", power_hp=130, doors=5, seats=5, vehicle_type="ocasion",
+        description="Coche", slug="2020-seat-leon"
+    )
+    await db.vehicles.insert_one(vehicle.dict())
+    return vehicle.id
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+
+def test_parallel_uploads_keep_every_image_and_one_primary(app_db):
+    async def test(db):
+        vehicle_id = await create_vehicle(db)
+        content = jpeg_bytes()
+        files = [("files", (f"{i}.jpg", content, "image/jpeg")) for i in range(FILES_PER_UPLOAD)]
+        async with client() as http:
+            responses = await asyncio.gather(*(
+                http.post(f"/api/vehicles/{vehicle_id}/images", files=files) for _ in range(PARALLEL_UPLOADS)
+            ))
+        assert [response.status_code for response in responses] == [200] * PARALLEL_UPLOADS
+
+        vehicle = await db.vehicles.find_one({"id": vehicle_id})
+        images = vehicle["images"]
+        assert len(images) == PARALLEL_UPLOADS * FILES_PER_UPLOAD
+        assert len({image["id"] for image in images}) == len(images)
+        assert sum(image["is_primary"] for image in images) == 1
+        reported = [image for response in responses for image in response.json()["images"]]
+        assert sum(image["is_primary"] for image in reported) == 1
+        # Identical content is stored once and referenced by every image
+        blob = await db.image_blobs.find_one({"_id": images[0]["content_key"]})
+        assert blob["refcount"] == len(images)
+
+    app_db(test)
+
+
+def test_deleting_primary_promotes_another_image(app_db):
+    async def test(db):
+        vehicle_id = await create_vehicle(db)
+        files = [("files", (f"{color}.jpg", jpeg_bytes(color), "image/jpeg")) for color in ("red", "green", "blue")]
+        async with client() as http:
+            uploaded = (await http.post(f"/api/vehicles/{vehicle_id}/images", files=files)).json()["images"]
+            primary = next(image for image in uploaded if image["is_primary"])
+            responses = await asyncio.gather(*(
+                http.delete(f"/api/vehicles/{vehicle_id}/images/{primary['id']}") for _ in range(3)
+            ))
+        assert sorted(response.status_code for response in responses) == [200, 404, 404]
+
+        images = (await db.vehicles.find_one({"id": vehicle_id}))["images"]
+        assert primary["id"] not in {image["id"] for image in images}
+        assert [image["is_primary"] for image in images] == [True, False]
+        assert await db.image_blobs.find_one({"_id": primary["content_key"]}) is None
+        assert server.storage.local_path(primary["filename"]) is None
+        remaining = await db.image_blobs.find_one({"_id": images[0]["content_key"]})
+        assert all(server.storage.local_path(name) for name in blob_filenames(remaining))
+
+    app_db(test)
@@ -0,0 +1,67 @@
+"""CSV import parsing: quote handling follows the csv module, malformed rows are reported per row."""
+import asyncio
+import csv
+import io
+
+import pytest
+
+import server
+from inventory_import import (
+    MalformedRecord, coerce_csv_row, import_vehicles, iter_csv_records, iter_lines
+)
+
+HEADER = "brand,model,year,price,kilometers,fuel_type,transmission,color,power_hp,doors,seats,vehicle_type,description\n"
+
+
+def row(description: str, model: str = "Leon") -> str:
+    return f"Seat,{model},2020,15000,30000,Gasolina,Manual,Rojo,130,5,5,ocasion,{description}\n"
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def parse(body: str, chunk_size: int = 7) -> list:
+    async def collect():
+        return [record async for record in iter_csv_records(iter_lines(chunked(body.encode(), chunk_size)))]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_bare_quote_inside_unquoted_cell_is_literal(chunk_size):
+    body = HEADER + row('Llantas 18" aleacion') + row("Segundo", "Ibiza") + row("Tercero", "Arona")
+    records = parse(body, chunk_size)
+    assert records == [dict(r) for r in csv.DictReader(io.StringIO(body))]
+    assert [record["description"] for record in records] == ['Llantas 18" aleacion', "Segundo", "Tercero"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_quoted_cells_span_lines(chunk_size):
+    body = HEADER + row('"Primera línea\r\nsegunda, con ""comillas"""') + "\n" + row("Después")
+    records = parse(body, chunk_size)
+    assert [record["description"] for record in records] == ['Primera línea\r\nsegunda, con "comillas"', "Después"]
+
+
+def test_unterminated_quote_is_reported_and_parsing_resumes():
+    records = parse(HEADER + row("Bien", "Ibiza") + row('"Sin cerrar') + row("Sigue", "Arona"))
+    assert records[0]["description"] == "Bien"
+    assert isinstance(records[1], MalformedRecord)
+    assert [record["description"] for record in records[2:]] == ["Sigue"]
+
+
+def test_import_reports_malformed_rows_and_keeps_the_rest():
+    class Collection:
+        def find(self, *args, **kwargs):
+            async def nothing():
+                return
+                yield
+            return nothing()
+
+    body = HEADER + row('Llantas 18" aleacion') + row('"Sin cerrar', "Ibiza") + row("Sigue", "Arona")
+    report = asyncio.run(import_vehicles(
+        Collection(), iter_csv_records(iter_lines(chunked(body.encode(), 64))), server.VehicleCreate,
+        server.Vehicle, server.create_slug, dry_run=True, row_transform=coerce_csv_row
+    ))
+    assert (report["rows"], report["valid"], report["invalid"], report["inserted"]) == (3, 2, 1, 2)
+    assert report["errors"][0]["row"] == 2
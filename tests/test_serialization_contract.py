@@ -0,0 +1,126 @@
+"""The trusted-read serializer must produce the same bytes as the Pydantic path."""
+from datetime import datetime, timezone
+from typing import List
+
+import pytest
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+import serialization
+import server
+from fieldsets import partial_model
+from serialization import dump_document, dump_documents
+
+
+def mongo_datetime(offset: int = 0) -> datetime:
+    # Mongo stores milliseconds and returns naive UTC datetimes
+    return datetime(2025, 3, 14, 9, 26, 53, 589000 + offset * 1000)
+
+
+def vehicle_document(**overrides) -> dict:
+    document = {
+        "_id": ObjectId(),
+        "id": "4f6c1d0e-0000-4000-8000-000000000001",
+        "brand": "Škoda",
+        "model": "Octavia Combi",
+        "year": 2021,
+        "price": 18990.0,
+        "kilometers": 45210,
+        "fuel_type": "Eléctrico",
+        "transmission": "Automático",
+        "color": "Gris",
+        "power_hp": 150,
+        "doors": 5,
+        "seats": 5,
+        "trunk_volume": 640,
+        "warranty_months": 12,
+        "vehicle_type": "ocasion",
+        "status": "available",
+        "description": "Único propietario, \"libro\" de revisiones\nal día",
+        "features": ["Navegador", "Cámara trasera"],
+        "images": [{
+            "id": "img-1",
+            "filename": "img-1_main.jpg",
+            "url": "/uploads/img-1_main.jpg",
+            "is_primary": True,
+            "variants": [{"url": "/uploads/img-1_320w.webp", "width": 320, "height": 240,
+                          "format": "webp", "bytes": 10240}],
+        }],
+        "slug": "2021-škoda-octavia-combi",
+        "created_at": mongo_datetime(),
+        "updated_at": mongo_datetime(1),
+    }
+    document.update(overrides)
+    return document
+
+
+def legacy_vehicle_document() -> dict:
+    """Written before trunk_volume, variants and warranty_months existed"""
+    document = vehicle_document(id="4f6c1d0e-0000-4000-8000-000000000002", created_at=datetime(2024, 1, 1))
+    for field in ("trunk_volume", "warranty_months", "features"):
+        del document[field]
+    del document["images"][0]["variants"]
+    return document
+
+
+def int_priced_vehicle_document() -> dict:
+    """Mongo returns an int written to a float field as an int; Pydantic emits 18990.0"""
+    return vehicle_document(id="4f6c1d0e-0000-4000-8000-000000000003", price=18990, kilometers=45210.0)
+
+
+DOCUMENTS = [
+    vehicle_document(), legacy_vehicle_document(), vehicle_document(images=[], trunk_volume=None),
+    int_priced_vehicle_document(),
+]
+
+
+def pydantic_bytes(model, documents) -> bytes:
+    if isinstance(documents, list):
+        return TypeAdapter(List[model]).dump_json([model(**document) for document in documents])
+    return TypeAdapter(model).dump_json(model(**documents))
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+@pytest.mark.parametrize("model", [server.Vehicle, server.VehicleSummary])
+def test_vehicle_lists_match_pydantic(encoder, model):
+    assert dump_documents(model, DOCUMENTS) == pydantic_bytes(model, DOCUMENTS)
+
+
+def test_single_vehicle_matches_pydantic(encoder):
+    for document in DOCUMENTS:
+        assert dump_document(server.Vehicle, document) == pydantic_bytes(server.Vehicle, document)
+
+
+def test_partial_fieldset_matches_pydantic(encoder):
+    model = partial_model(server.Vehicle, ("id", "brand", "price", "images", "updated_at"))
+    assert dump_documents(model, DOCUMENTS) == pydantic_bytes(model, DOCUMENTS)
+
+
+def test_content_models_match_pydantic(encoder):
+    article = {"_id": ObjectId(), "id": "n1", "title": "Nuevo concesionario", "content": "Texto",
+               "excerpt": "Resumen", "published": True, "created_at": mongo_datetime(), "updated_at": mongo_datetime()}
+    testimonial = {"_id": ObjectId(), "id": "t1", "name": "Lucía", "content": "¡Genial!", "rating": 5,
+                   "published": True, "created_at": mongo_datetime()}
+    assert dump_documents(server.NewsArticle, [article]) == pydantic_bytes(server.NewsArticle, [article])
+    assert dump_document(server.NewsArticle, article) == pydantic_bytes(server.NewsArticle, article)
+    assert dump_documents(server.Testimonial, [testimonial]) == pydantic_bytes(server.Testimonial, [testimonial])
+
+
+def test_timezone_aware_datetimes_match_pydantic(encoder):
+    document = vehicle_document(created_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+    assert dump_document(server.Vehicle, document) == pydantic_bytes(server.Vehicle, document)
+
+
+def test_missing_required_field_is_an_error():
+    document = vehicle_document()
+    del document["brand"]
+    with pytest.raises(KeyError):
+        dump_document(server.Vehicle, document)
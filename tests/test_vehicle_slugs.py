@@ -0,0 +1,43 @@
+"""Editing a vehicle keeps its slug unless the name changes, and renames stay unique.
+
+Runs against the in-memory mongomock-motor stand-in; skipped without it.
+"""
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+
+
+def leon(year: int = 2020, price: float = 15000) -> server.VehicleCreate:
+    return server.VehicleCreate(
+        brand="Seat", model="Leon", year=year, price=price, kilometers=30000, fuel_type="Gasolina",
+        transmission="Manual", color="Rojo", power_hp=130, doors=5, seats=5, vehicle_type="ocasion",
+        description="Coche"
+    )
+
+
+def test_update_keeps_or_reallocates_the_slug(monkeypatch):
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient()["test_vehicle_slugs"])
+
+    async def test():
+        first = await server.create_vehicle(leon(), current_user=None)
+        second = await server.create_vehicle(leon(), current_user=None)
+        newer = await server.create_vehicle(leon(year=2021), current_user=None)
+        assert (first.slug, second.slug, newer.slug) == ("2020-seat-leon", "2020-seat-leon-2", "2021-seat-leon")
+
+        repriced = await server.update_vehicle(second.id, leon(price=14000), current_user=None)
+        assert repriced.slug == "2020-seat-leon-2"
+
+        renamed = await server.update_vehicle(second.id, leon(year=2021), current_user=None)
+        assert renamed.slug == "2021-seat-leon-2"
+        unchanged = await server.update_vehicle(newer.id, leon(year=2021, price=16000), current_user=None)
+        assert unchanged.slug == "2021-seat-leon"
+
+        # Its own slug does not collide: "SEAT" builds the same slug it already has.
+        recased = await server.update_vehicle(first.id, leon().model_copy(update={"brand": "SEAT"}), current_user=None)
+        assert recased.slug == "2020-seat-leon"
+
+    asyncio.run(test())
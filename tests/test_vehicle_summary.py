@@ -0,0 +1,47 @@
+"""List items carry only the primary image, so every vehicle with images needs one.
+
+Runs against the in-memory mongomock-motor stand-in; skipped without it.
+"""
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+from indexes import apply_migrations  # noqa: E402
+
+
+def vehicle(slug: str, images: list) -> dict:
+    return server.Vehicle(
+        brand="Seat", model="Leon", year=2020, price=15000, kilometers=30000, fuel_type="Gasolina",
+        transmission="Manual", color="Rojo", power_hp=130, doors=5, seats=5, vehicle_type="ocasion",
+        description="Coche", slug=slug, images=[server.VehicleImage(**image) for image in images]
+    ).model_dump()
+
+
+def image(image_id: str, is_primary: bool = False) -> dict:
+    return {"id": image_id, "filename": f"{image_id}.jpg", "url": f"/uploads/{image_id}.jpg", "is_primary": is_primary}
+
+
+def test_vehicle_without_primary_image_lists_its_first_image():
+    async def test():
+        db = mongomock_motor.AsyncMongoMockClient()["test_vehicle_summary"]
+        orphaned = vehicle("sin-principal", [image("a"), image("b")])
+        chosen = vehicle("con-principal", [image("c"), image("d", is_primary=True)])
+        bare = vehicle("sin-fotos", [])
+        await db.vehicles.insert_many([dict(orphaned), dict(chosen), dict(bare)])
+
+        await apply_migrations(db)
+
+        summaries = {
+            document["slug"]: server.VehicleSummary(**document)
+            async for document in db.vehicles.find({}, server.VEHICLE_SUMMARY_PROJECTION)
+        }
+        assert [item.id for item in summaries["sin-principal"].images] == ["a"]
+        assert [item.id for item in summaries["con-principal"].images] == ["d"]
+        assert summaries["sin-fotos"].images == []
+        stored = await db.vehicles.find_one({"id": orphaned["id"]})
+        assert [item["is_primary"] for item in stored["images"]] == [True, False]
+
+    asyncio.run(test())